@@ -1,16 +1,50 @@
 #!/usr/bin/env python
 
+import os
 import re
 import sys
+import json
+import math
+import time
+import heapq
+import shlex
+import bisect
+import shutil
+import signal
+import hashlib
+import tarfile
+import zipfile
 import tempfile
+import functools
+import posixpath
+import selectors
+import threading
+import concurrent.futures
 import subprocess  # nosec
-from argparse import Namespace, ArgumentParser
-from typing import Any, Dict, List, Tuple, Union
+from collections import deque
+from contextlib import ExitStack, suppress, contextmanager
+from argparse import Namespace, ArgumentParser, ArgumentTypeError
+from typing import (  # noqa: TYP001
+    IO,
+    Any,
+    Set,
+    Dict,
+    List,
+    Deque,
+    Tuple,
+    Union,
+    Pattern,
+    Callable,
+    Iterator,
+    FrozenSet,
+    cast,
+)
 
 import yaml
 from yaml.scanner import ScannerError
+from yaml.error import MarkedYAMLError
 from yaml.resolver import BaseResolver
-from yaml import Node, Loader, ScalarNode
+from yaml import Node, Loader, ScalarNode, MappingNode, SequenceNode
 
 
 __all__: List[str] = ["main", "PreCommitConfigShellcheck"]
@@ -20,6 +54,26 @@ __all__: List[str] = ["main", "PreCommitConfigShellcheck"]
 VERSION = (0, 3, 3)
 __version__ = ".".join(map(str, VERSION))
 
+# hook field value with number of line it is attached to
+EntryField = Dict[str, Union[int, str]]
+# hook id and entry fields
+Entry = Dict[str, EntryField]
+# shellcheck process started with either launcher
+EntryProcess = Union["subprocess.Popen[bytes]", "SpawnedProcess"]
+# temporary file with entry, its shellcheck process and start time
+StartedEntry = Tuple[IO[str], EntryProcess, float]
+# started entries by their indexes
+RunningEntries = Dict[int, StartedEntry]
+# threads waiting for popen processes outputs and finish times by entries indexes
+EntriesOutputs = Dict[
+    int, "concurrent.futures.Future[Tuple[Tuple[bytes, bytes], float]]"
+]
+# language server shellcheck processes and entries bodies by their future outputs
+RunningChecks = Dict[
+    "concurrent.futures.Future[Tuple[bytes, bytes]]",
+    Tuple["subprocess.Popen[bytes]", str],
+]
+
 
 class CustomYamlLoader(Loader):
     """Custom class for YAML loader."""
@@ -70,242 +124,3449 @@ class CustomYamlLoader(Loader):
         return super().construct_mapping(node=node, deep=deep)  # type: ignore
 
 
-class PreCommitConfigShellcheck:
-    """Tool for shellchecking pre-commit config files."""
+class AdaptiveConcurrency:
+    """Limit of concurrently running shellcheck processes."""
 
-    EXIT_CODE_SUCCESS: int = 0
-    EXIT_CODE_ERROR: int = 2
-    EXIT_CODE_FILE_NOT_FOUND: int = 5
+    CGROUP_ROOT: str = "/sys/fs/cgroup"
+    # memory expected to be used by a single shellcheck process
+    JOB_MEMORY: int = 64 * 1024 * 1024
+    # growth of latency per expected cost relative to the best one
+    # treated as contention
+    LATENCY_THRESHOLD: float = 2.0
+    LATENCY_SMOOTHING: float = 0.3
 
-    def __init__(self):
-        """Get command line args."""
-        self.options: Namespace = self._get_options()
+    def __init__(
+        self,
+        max_jobs: Union[int, None] = None,  # noqa: SIM907
+        log: Callable[[str], None] = lambda message: None,
+    ):
+        """
+        Size concurrency from CPU quota and available memory.
+
+        :param max_jobs: concurrency ceiling
+        :type max_jobs: Union[int, None]
+        :param log: callback to report scheduling decisions to
+        :type log: Callable[[str], None]
+        """
+        self.log = log
+        self.cpus: int = self.get_cpu_limit()
+        # load average is system-wide, so it is compared with all host CPUs
+        self.host_cpus: int = os.cpu_count() or 1
+        limits = {"CPU": self.cpus}
+        memory = self.get_available_memory()
+        if memory is not None:
+            limits["memory"] = max(1, memory // self.JOB_MEMORY)
+        if max_jobs is not None:
+            limits["max jobs"] = max(1, max_jobs)
+        reason = min(limits, key=limits.__getitem__)
+        self.limit: int = limits[reason]
+        self.target: int = self.limit
+        self.latency: Union[float, None] = None  # noqa: SIM907
+        self.best_latency: Union[float, None] = None  # noqa: SIM907
+        details = ", ".join(f"{key}: {value}" for key, value in limits.items())
+        self.log(f"scheduler: {self.limit} jobs limited by {reason} ({details})")
+
+    @classmethod
+    def _get_cgroup_directories(cls) -> List[str]:
+        """
+        Get cgroup v2 directories of the current process, the closest one first.
+
+        :return: cgroup directories
+        :rtype: List[str]
+        """
+        directories = [cls.CGROUP_ROOT]
+        with suppress(OSError), open("/proc/self/cgroup") as stream:
+            for line in stream:
+                if line.startswith("0::"):
+                    path = os.path.relpath(line[3:].strip(), "/")
+                    directories.insert(0, os.path.join(cls.CGROUP_ROOT, path))
+
+        return directories
+
+    @classmethod
+    def _read_cgroup_file(cls, name: str) -> Union[str, None]:  # noqa: SIM907
+        """
+        Read cgroup v2 interface file of the current process.
+
+        :param name: interface file name
+        :type name: str
+        :return: file content or None if not available
+        :rtype: Union[str, None]
+        """
+        for directory in cls._get_cgroup_directories():
+            try:
+                with open(os.path.join(directory, name)) as stream:
+                    return stream.read().strip()
+            except OSError:
+                continue
+
+        return None
+
+    @classmethod
+    def _get_cpu_quota(cls) -> Union[int, None]:  # noqa: SIM907
+        """
+        Get number of CPUs allowed by cgroup quota.
+
+        :return: CPUs number or None if not limited
+        :rtype: Union[int, None]
+        """
+        quota = (cls._read_cgroup_file("cpu.max") or "max").split()
+        if len(quota) != 2 or quota[0] == "max":
+            return None
+
+        return math.ceil(int(quota[0]) / int(quota[1]))
+
+    @classmethod
+    def get_cpu_limit(cls) -> int:
+        """
+        Get number of CPUs available for the process respecting cgroup quota.
+
+        :return: CPUs number
+        :rtype: int
+        """
+        if hasattr(os, "sched_getaffinity"):
+            cpus = len(os.sched_getaffinity(0))
+        else:  # pragma: no cover
+            cpus = os.cpu_count() or 1
+        quota = cls._get_cpu_quota()
+
+        return max(1, cpus if quota is None else min(cpus, quota))
+
+    @classmethod
+    def get_available_memory(cls) -> Union[int, None]:  # noqa: SIM907
+        """
+        Get memory available for the process respecting cgroup limit.
+
+        :return: available memory in bytes or None if unknown
+        :rtype: Union[int, None]
+        """
+        limit = cls._read_cgroup_file("memory.max")
+        current = cls._read_cgroup_file("memory.current")
+        if limit and limit != "max" and current:
+            return max(0, int(limit) - int(current))
+        with suppress(OSError), open("/proc/meminfo") as stream:
+            for line in stream:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+
+        return None
+
+    def _add_latency(self, latency: float) -> Tuple[float, float]:
+        """
+        Add latency of finished shellcheck process to the smoothed one.
+
+        :param latency: shellcheck process run time per expected cost
+        :type latency: float
+        :return: smoothed and best latencies
+        :rtype: Tuple[float, float]
+        """
+        if self.latency is None or self.best_latency is None:
+            self.latency = self.best_latency = latency
+        else:
+            self.latency += self.LATENCY_SMOOTHING * (latency - self.latency)
+            self.best_latency = min(self.best_latency, latency)
+
+        return self.latency, self.best_latency
 
     @staticmethod
-    def _get_options() -> Namespace:
+    def _get_load() -> float:
         """
-        Parse commandline options arguments.
+        Get system load average for the last minute.
 
-        :return: parsed command line arguments
-        :rtype: Namespace
+        :return: load average or zero if not available
+        :rtype: float
         """
-        parser: ArgumentParser = ArgumentParser(
-            description="Tool for checking entry points in the pre-commit config with ShellCheck."  # noqa: E501
-        )
+        return os.getloadavg()[0] if hasattr(os, "getloadavg") else 0.0
 
-        parser.add_argument(
-            "path",
-            nargs="?",
-            default=".pre-commit-config.yaml",
-            action="store",
-            metavar="PATH",
-            help="file to check",
-        )
-        parser.add_argument(
-            "-s",
-            "--shellcheck",
-            action="store",
-            dest="shellcheck",
-            type=str,
-            default="shellcheck",
-            metavar="SHELLCHECK",
-            help="ShellCheck path",
-        )
-        parser.add_argument(
-            "-v",
-            "--version",
-            action="version",
-            version=f"{__version__}",
-        )
+    def _set_target(self, target: int, reason: str) -> None:
+        """
+        Change number of concurrently running processes.
 
-        options: Namespace = parser.parse_args()
+        :param target: new number of processes
+        :type target: int
+        :param reason: reason to report
+        :type reason: str
+        """
+        self.log(f"scheduler: {self.target} -> {target} jobs: {reason}")
+        self.target = target
 
-        return options
+    def _adapt(self, latency: float, best_latency: float) -> None:
+        """
+        Change concurrency according to the smoothed latency and load average.
 
-    def _parse_file(
-        self,
-    ) -> Dict[str, List[Dict[str, Any]]]:  # noqa: SIM907
+        :param latency: smoothed latency per expected cost
+        :type latency: float
+        :param best_latency: best latency per expected cost
+        :type best_latency: float
+        """
+        load = self._get_load()
+        if self.target > 1 and load > self.host_cpus:
+            self._set_target(
+                self.target - 1,
+                f"load average {load:.2f} exceeds {self.host_cpus} host CPUs",
+            )
+        elif self.target > 1 and latency > best_latency * self.LATENCY_THRESHOLD:
+            self._set_target(
+                self.target - 1,
+                f"relative latency {latency:.3g} against best {best_latency:.3g}",
+            )
+        elif self.target < self.limit:
+            self._set_target(
+                self.target + 1,
+                f"relative latency {latency:.3g}, load average {load:.2f}",
+            )
+
+    def update(self, latency: float, cost: float = 1.0) -> None:
+        """
+        Adapt concurrency to the latency of finished shellcheck process.
+
+        Latency is divided by the expected cost of the checked entry,
+        so entries of different size do not look like contention.
+        Entries without expected cost, like empty ones, are not taken
+        into account.
+
+        :param latency: shellcheck process run time in seconds
+        :type latency: float
+        :param cost: expected cost of the checked entry
+        :type cost: float
+        """
+        if cost > 0:
+            self._adapt(*self._add_latency(latency / cost))
+
+
+class Metrics:
+    """Tool counters and phase durations in Prometheus text format."""
+
+    PREFIX: str = "pre_commit_config_shellcheck"
+    COUNTERS: Dict[str, str] = {
+        "configs_parsed": "Number of parsed config files.",
+        "entries_found": "Number of entries found in config files.",
+        "entries_checked": "Number of entries checked with ShellCheck.",
+        "entries_skipped": "Number of entries not checked because of fail fast mode.",  # noqa: E501
+        "entries_prefiltered": "Number of trivially clean entries not checked with ShellCheck.",  # noqa: E501
+        "entries_deduplicated": "Number of entries sharing ShellCheck result with the same entry.",  # noqa: E501
+        "cache_hits": "Number of results replayed from cache.",
+        "cache_misses": "Number of results missing in cache.",
+        "shellcheck_spawns": "Number of started ShellCheck processes.",
+    }
+    PHASES: Tuple[str, ...] = ("parse", "extraction", "spawn", "wait", "render")
+    BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    def __init__(self, enabled: bool = False):
+        """
+        Initialize empty metrics.
+
+        :param enabled: whether metrics are collected
+        :type enabled: bool
+        """
+        self.enabled = enabled
+        self.counters: Dict[str, int] = dict.fromkeys(self.COUNTERS, 0)
+        self.durations: Dict[str, List[float]] = {phase: [] for phase in self.PHASES}
+
+    def inc(self, name: str, value: int = 1) -> None:
+        """
+        Increase counter.
+
+        :param name: counter name
+        :type name: str
+        :param value: value to add
+        :type value: int
+        """
+        if self.enabled:
+            self.counters[name] += value
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
         """
-        Parse requested file.
+        Measure duration of the wrapped phase.
 
-        :return: parsed config
-        :rtype: Dict[str, List[Dict[str, Any]]]
+        :param phase: phase name
+        :type phase: str
+        :yields: control to the wrapped phase
         """
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
         try:
-            with open(self.options.path) as stream:
-                file_: Dict[str, Any] = yaml.load(  # nosec  # noqa: DUO109
-                    stream=stream, Loader=CustomYamlLoader
+            yield
+        finally:
+            self.durations[phase].append(time.perf_counter() - started)
+
+    @staticmethod
+    def _render_header(metric: str, help_: str, type_: str) -> List[str]:
+        """
+        Render metric description and type lines.
+
+        :param metric: metric name
+        :type metric: str
+        :param help_: metric description
+        :type help_: str
+        :param type_: metric type
+        :type type_: str
+        :return: rendered lines
+        :rtype: List[str]
+        """
+        return [f"# HELP {metric} {help_}", f"# TYPE {metric} {type_}"]
+
+    def render(self) -> str:
+        """
+        Render metrics in Prometheus text format.
+
+        :return: rendered metrics
+        :rtype: str
+        """
+        lines = []
+        for name, help_ in self.COUNTERS.items():
+            metric = f"{self.PREFIX}_{name}_total"
+            lines += self._render_header(metric, help_, "counter")
+            lines.append(f"{metric} {self.counters[name]}")
+        metric = f"{self.PREFIX}_phase_duration_seconds"
+        lines += self._render_header(
+            metric, "Duration of the tool phases.", "histogram"
+        )
+        for phase, durations in self.durations.items():
+            ordered = sorted(durations)
+            for bucket in self.BUCKETS:
+                count = bisect.bisect_right(ordered, bucket)
+                lines.append(
+                    f'{metric}_bucket{{phase="{phase}",le="{bucket}"}} {count}'
                 )
-        except FileNotFoundError:
-            sys.stderr.write(f"No file {self.options.path} found\n")
-            sys.exit(self.EXIT_CODE_FILE_NOT_FOUND)
-        except ScannerError:
-            sys.stderr.write(f"{self.options.path} is not a YAML file\n")
-            sys.exit(self.EXIT_CODE_ERROR)
+            lines += [
+                f'{metric}_bucket{{phase="{phase}",le="+Inf"}} {len(durations)}',
+                f'{metric}_sum{{phase="{phase}"}} {sum(durations)}',
+                f'{metric}_count{{phase="{phase}"}} {len(durations)}',
+            ]
+
+        return "\n".join(lines) + "\n"
 
-        return file_
 
-    def _find_entries(  # noqa: CCR001
-        self, data: Dict[str, Any]
-    ) -> List[Dict[str, Dict[str, Union[int, str]]]]:
+class SpawnedProcess:
+    """Process started with posix_spawn, its output is read by the launcher."""
+
+    def __init__(self, launcher: "ProcessLauncher", pid: int, fds: Tuple[int, int]):
         """
-        Find all entries in provided config.
+        Initialize running process.
 
-        :param data: constructed mapping of file
-        :type data: Dict[str, Any]
-        :return: list of ids and entries with number of lines they are attached to
-        :rtype: List[Dict[str, Dict[str, Union[int, str]]]]
+        :param launcher: launcher reading process output
+        :type launcher: ProcessLauncher
+        :param pid: process ID
+        :type pid: int
+        :param fds: read ends of process stdout and stderr pipes
+        :type fds: Tuple[int, int]
         """
-        result: List[Dict[str, Dict[str, Union[int, str]]]] = []
-        try:
-            for repository in data.get("repos", []):
-                for hook in repository.get("hooks", []):
-                    if "entry" in hook:
-                        result.append(
-                            {
-                                "id": {"line": hook["__line__id"], "id": hook["id"]},
-                                "entry": {
-                                    "line": hook["__line__entry"],
-                                    "entry": hook["entry"],
-                                },
-                            }
-                        )
-        except TypeError:
-            sys.stderr.write(
-                f"An error happened while checking {self.options.path} file: incorrect format\n"  # noqa: E501
-            )
-            sys.exit(self.EXIT_CODE_ERROR)
+        self.launcher = launcher
+        self.pid = pid
+        self.fds = fds
+        self.returncode: Union[int, None] = None  # noqa: SIM907
+        self.output: Dict[int, bytearray] = {fd: bytearray() for fd in fds}
+        self.open: Set[int] = set(fds)
+        # time the process closed its output
+        self.finished: Union[float, None] = None  # noqa: SIM907
 
-        return result
+    def _set_status(self, status: int) -> None:
+        """
+        Store exit code from wait status.
 
-    def _list_entries(
-        self,
-    ) -> List[Dict[str, Dict[str, Union[int, str]]]]:  # noqa: SIM907
+        :param status: wait status
+        :type status: int
         """
-        Parse requested file and find all entries in it.
+        if os.WIFSIGNALED(status):
+            self.returncode = -os.WTERMSIG(status)
+        else:
+            self.returncode = os.WEXITSTATUS(status)
 
-        :return: list of ids and entries with number of lines they are attached to
-        :rtype: List[Dict[str, Dict[str, Union[int, str]]]]
+    def poll(self) -> Union[int, None]:  # noqa: SIM907
         """
-        file = self._parse_file()
-        if file:
-            result = self._find_entries(file)
-            if result:
+        Check if process has terminated.
 
-                return result
+        :return: exit code or None if process is running
+        :rtype: Union[int, None]
+        """
+        if self.returncode is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                self._set_status(status)
 
-        return []
+        return self.returncode
 
-    def _create_output(
-        self, entry: Dict[str, Dict[str, Union[int, str]]], output: str
-    ) -> Tuple[str, int]:
+    def wait(self) -> int:
         """
-        Edit and write shellcheck output.
+        Wait for process to terminate.
 
-        :param entry: entry data to insert into output
-        :type entry: Dict[str, Dict[str, Union[int, str]]]
-        :param output: base output to edit and process
-        :type output: str
-        :return: subprocess output with process exit code
-        :rtype: Tuple[str, int]
+        :return: exit code
+        :rtype: int
         """
-        # regular expression for finding line number from output text:
-        # returns two groups: "line #" for output replacement and line number itself
-        regular = re.findall(r"In entry \".*\" (?P<switch>line (?P<line>\d+))", output)
-        if not regular:
-            return output, self.EXIT_CODE_SUCCESS
-        for line_number in regular:
-            # subtract 2 because of number of lines difference
-            # in temporary file and source file
-            entry_line = int(entry["entry"]["line"])
-            new_line_number = (entry_line + int(line_number[1])) - 2
+        if self.returncode is None:
+            _, status = os.waitpid(self.pid, 0)
+            self._set_status(status)
 
-            output = output.replace(
-                line_number[0],
-                f"on line {new_line_number}",
-            )
+        return cast(int, self.returncode)
+
+    def kill(self) -> None:
+        """Kill process and stop reading its output."""
+        if self.returncode is None:
+            with suppress(ProcessLookupError):
+                os.kill(self.pid, signal.SIGKILL)
+        for fd in list(self.open):
+            self.launcher.close(self, fd)
+
+    def communicate(self) -> Tuple[bytes, bytes]:
+        """
+        Read output until process closes it and wait for process to terminate.
+
+        :return: process stdout and stderr
+        :rtype: Tuple[bytes, bytes]
+        """
+        self.launcher.collect(self)
+        self.wait()
+
+        return bytes(self.output[self.fds[0]]), bytes(self.output[self.fds[1]])
 
-        return output, self.EXIT_CODE_ERROR
+
+class ProcessLauncher:
+    """Processes started with posix_spawn and read with a single selector."""
+
+    CHUNK: int = 65536
+
+    def __init__(self) -> None:
+        """Initialize launcher without running processes."""
+        self.selector = selectors.DefaultSelector()
 
     @staticmethod
-    def _write_output(output: str, code: int) -> None:
+    def is_supported() -> bool:
         """
-        Write whole tool output and exit with desired code.
+        Check if platform supports posix_spawn.
 
-        :param output: output to write in console:
-        :type output: str
-        :param code: exit code for the tool
-        :type code: int
+        :return: whether launcher could be used
+        :rtype: bool
         """
-        sys.stdout.write(output)
-        sys.exit(code)
+        return hasattr(os, "posix_spawnp")
 
-    def _check_entry_file(
+    def spawn(self, args: List[str]) -> SpawnedProcess:
+        """
+        Start process with stdout and stderr pipes.
+
+        :param args: program and its arguments, program is searched in PATH
+        :type args: List[str]
+        :return: started process
+        :rtype: SpawnedProcess
+        """
+        stdout, stdout_writer = os.pipe()
+        stderr, stderr_writer = os.pipe()
+        with ExitStack() as stack:
+            # read ends are closed here only if process could not be started
+            stack.callback(os.close, stdout)
+            stack.callback(os.close, stderr)
+            try:
+                pid = os.posix_spawnp(  # nosec
+                    args[0],
+                    args,
+                    os.environ,
+                    file_actions=[
+                        (os.POSIX_SPAWN_DUP2, stdout_writer, 1),
+                        (os.POSIX_SPAWN_DUP2, stderr_writer, 2),
+                    ],
+                    # signals ignored by Python are restored like subprocess does
+                    setsigdef=(signal.SIGPIPE, signal.SIGXFSZ),
+                )
+            finally:
+                os.close(stdout_writer)
+                os.close(stderr_writer)
+            stack.pop_all()
+        process = SpawnedProcess(launcher=self, pid=pid, fds=(stdout, stderr))
+        for fd in process.fds:
+            self.selector.register(fd, selectors.EVENT_READ, process)
+
+        return process
+
+    def close(self, process: SpawnedProcess, fd: int) -> None:
+        """
+        Stop reading process output pipe.
+
+        :param process: process the pipe belongs to
+        :type process: SpawnedProcess
+        :param fd: read end of the pipe
+        :type fd: int
+        """
+        self.selector.unregister(fd)
+        os.close(fd)
+        process.open.discard(fd)
+        if not process.open:
+            process.finished = time.monotonic()
+
+    def _read(self) -> None:
+        """Read output of all running processes which is ready to be read."""
+        for key, _ in self.selector.select():
+            data = os.read(key.fd, self.CHUNK)
+            if data:
+                key.data.output[key.fd] += data
+            else:
+                self.close(key.data, key.fd)
+
+    def collect(self, process: SpawnedProcess) -> None:
+        """
+        Read output of all running processes until the process closes its output.
+
+        :param process: process to read whole output of
+        :type process: SpawnedProcess
+        """
+        while process.open:
+            self._read()
+
+    def wait_any(self, processes: List[SpawnedProcess]) -> SpawnedProcess:
+        """
+        Read output of all running processes until any of the processes closes it.
+
+        :param processes: processes to wait for
+        :type processes: List[SpawnedProcess]
+        :return: the first of the processes which closed its output
+        :rtype: SpawnedProcess
+        """
+        while all(process.open for process in processes):
+            self._read()
+
+        return next(process for process in processes if not process.open)
+
+
+class LanguageServer:
+    """Language server publishing ShellCheck diagnostics of edited configs."""
+
+    # delay after the last change before the document is checked
+    DEBOUNCE: float = 0.03
+    # interval of checking whether running ShellCheck processes are superseded
+    POLL_INTERVAL: float = 0.01
+    RESULTS_LIMIT: int = 10000
+    SEVERITIES: Dict[str, int] = {"error": 1, "warning": 2, "info": 3, "style": 4}
+    LINE_BREAK: Pattern[str] = re.compile(r"\r\n|\r|\n")
+
+    def __init__(
         self,
-        entry: Dict[str, Dict[str, Union[int, str]]],
-        tmp,
-    ) -> Tuple[bytes, bytes]:
+        shellcheck: str,
+        concurrency: AdaptiveConcurrency,
+        reader: IO[bytes],
+        writer: IO[bytes],
+    ):
         """
-        Run a shellcheck command on temporary file.
+        Initialize server without open documents.
 
-        :param entry: entry data to insert into output
-        :type entry: Dict[str, Dict[str, Union[int, str]]]
-        :param tmp: created temporary file
-        :type tmp: _TemporaryFileWrapper
-        :return: process output
-        :rtype: Tuple[bytes, bytes]
+        :param shellcheck: ShellCheck path
+        :type shellcheck: str
+        :param concurrency: limit of concurrently running shellcheck processes
+        :type concurrency: AdaptiveConcurrency
+        :param reader: stream to read client messages from
+        :type reader: IO[bytes]
+        :param writer: stream to write server messages to
+        :type writer: IO[bytes]
         """
-        try:
-            process = subprocess.Popen(  # nosec
-                args=[self.options.shellcheck, tmp.name],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-        except FileNotFoundError:
-            sys.stderr.write(f"No shellcheck found: '{self.options.shellcheck}'\n")
-            sys.exit(self.EXIT_CODE_FILE_NOT_FOUND)
+        self.shellcheck = shellcheck
+        self.concurrency = concurrency
+        self.reader = reader
+        self.writer = writer
+        self.documents: Dict[str, str] = {}
+        # documents revisions, changed on every edit to cancel superseded checks
+        self.revisions: Dict[str, int] = {}
+        # time of the last change of documents waiting to be checked
+        self.pending: Dict[str, float] = {}
+        # lines and hooks of the last parsed documents texts
+        self.parsed: Dict[str, Dict[str, Any]] = {}
+        # ShellCheck comments by entries bodies, shared between documents
+        self.results: Dict[str, List[Dict[str, Any]]] = {}
+        self.stopping = False
+        # whether client requested shutdown before exit
+        self.shutdown = False
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.worker = threading.Thread(target=self._work, daemon=True)
 
-        try:
-            stdout, stderr = process.communicate()
+    def _read_length(self) -> Union[int, None]:  # noqa: SIM907
+        """
+        Read client message headers.
 
-        except subprocess.TimeoutExpired as err:
-            sys.stderr.write(
-                f"Failed to check entrypoint {entry['id']['id']} on line {entry['entry']['line']}: {err.stderr}"  # noqa: E501
-            )
-            sys.exit(self.EXIT_CODE_ERROR)
+        :return: content length or None at the end of stream or without the header
+        :rtype: Union[int, None]
+        """
+        length = None
+        header = self.reader.readline()
+        while header.strip():
+            name, _, value = header.decode("ascii").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+            header = self.reader.readline()
 
-        if stderr:
-            sys.stderr.write(
-                f"Failed to check entrypoint {entry['id']['id']} on line {entry['entry']['line']}: {stderr.decode('UTF-8')}"  # noqa: E501
-            )
-            sys.exit(self.EXIT_CODE_ERROR)
+        return length if header else None
 
-        return stdout, stderr
+    def read_message(self) -> Union[Dict[str, Any], None]:  # noqa: SIM907
+        """
+        Read client message.
 
-    def _check_entries(self) -> None:
-        """Check the created file for possible entrypoints issues."""
-        result = ""
-        exit_ = self.EXIT_CODE_SUCCESS
-        for entry in self._list_entries():
-            with tempfile.NamedTemporaryFile("w+") as tmp:
-                tmp.write("#!/bin/sh\n")
-                tmp.write(str(entry["entry"]["entry"]))
-                tmp.flush()
+        :return: message or None at the end of stream
+        :rtype: Union[Dict[str, Any], None]
+        """
+        length = self._read_length()
+        if length is None:
+            return None
 
-                stdout, _ = self._check_entry_file(entry, tmp)
-                name = f"entry \"{entry['id']['id']}\""
-                output = stdout.decode("utf-8").replace(tmp.name, name)
+        return dict(json.loads(self.reader.read(length).decode("utf-8")))
 
-                output, code = self._create_output(entry=entry, output=output)
-                result += output
-                if code != self.EXIT_CODE_SUCCESS:
-                    exit_ = code
+    def write_message(self, message: Dict[str, Any]) -> None:
+        """
+        Write server message.
 
-        self._write_output(output=result, code=exit_)
+        :param message: message to write
+        :type message: Dict[str, Any]
+        """
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode("utf-8")
+        with self.write_lock:
+            self.writer.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii"))
+            self.writer.write(body)
+            self.writer.flush()
 
-    def check(self) -> None:
-        """Check file for entrypoints and verify them."""
-        self._check_entries()
+    @staticmethod
+    def _get_index(line: str, character: int) -> int:
+        """
+        Convert LSP character offset counted in UTF-16 code units to string index.
+
+        :param line: document line
+        :type line: str
+        :param character: UTF-16 offset
+        :type character: int
+        :return: string index
+        :rtype: int
+        """
+        units = 0
+        for index, char in enumerate(line):
+            if units >= character:
+                return index
+            units += 2 if ord(char) > 0xFFFF else 1
+
+        return len(line)
+
+    @staticmethod
+    def _get_character(line: str, index: int) -> int:
+        """
+        Convert string index to LSP character offset counted in UTF-16 code units.
+
+        :param line: document line
+        :type line: str
+        :param index: string index
+        :type index: int
+        :return: UTF-16 offset
+        :rtype: int
+        """
+        return index + sum(1 for char in line[:index] if ord(char) > 0xFFFF)
+
+    @classmethod
+    def apply_change(cls, text: str, change: Dict[str, Any]) -> str:
+        """
+        Apply full or incremental document change.
+
+        :param text: document text
+        :type text: str
+        :param change: LSP content change event
+        :type change: Dict[str, Any]
+        :return: changed document text
+        :rtype: str
+        """
+        if "range" not in change:
+            return str(change["text"])
+        lines = cls.LINE_BREAK.split(text)
+        breaks = [match.end() for match in cls.LINE_BREAK.finditer(text)]
+        starts = [0, *breaks]
+        offsets = []
+        for position in (change["range"]["start"], change["range"]["end"]):
+            number = position["line"]
+            if number >= len(lines):
+                offsets.append(len(text))
+                continue
+            index = cls._get_index(lines[number], position["character"])
+            offsets.append(starts[number] + index)
+        start, end = offsets
+
+        return text[:start] + str(change["text"]) + text[end:]
+
+    @staticmethod
+    def _get_value(node: Node, key: str) -> Union[Node, None]:  # noqa: SIM907
+        """
+        Get value node of the mapping node key.
+
+        :param node: mapping node
+        :type node: Node
+        :param key: key to get value of
+        :type key: str
+        :return: value node or None if node has no such key
+        :rtype: Union[Node, None]
+        """
+        pairs = node.value if isinstance(node, MappingNode) else []
+        values = [value for name, value in pairs if getattr(name, "value", None) == key]
+
+        return values[0] if values else None
+
+    @staticmethod
+    def _get_children(node: Node) -> List[Node]:
+        """
+        Get keys and values of mapping node or items of sequence node.
+
+        :param node: parent node
+        :type node: Node
+        :return: child nodes
+        :rtype: List[Node]
+        """
+        if isinstance(node, MappingNode):
+            return [child for pair in node.value for child in pair]
+        if isinstance(node, SequenceNode):
+            return list(node.value)
+
+        return []
+
+    @classmethod
+    def _has_aliases(cls, node: Node) -> bool:
+        """
+        Check if any node is reachable twice, i.e. through an alias.
+
+        :param node: root node
+        :type node: Node
+        :return: whether aliases are used
+        :rtype: bool
+        """
+        seen: Set[int] = set()
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            if id(node) in seen:
+                return True
+            seen.add(id(node))
+            nodes += cls._get_children(node)
+
+        return False
+
+    @staticmethod
+    def _get_block_indent(lines: List[str]) -> int:
+        """
+        Get indentation of block scalar body.
+
+        :param lines: block scalar body lines
+        :type lines: List[str]
+        :return: indentation of the first not empty line, 0 for empty body
+        :rtype: int
+        """
+        indents = [len(line) - len(line.lstrip(" ")) for line in lines if line.strip()]
+
+        return indents[0] if indents else 0
+
+    @classmethod
+    def _get_entry_origin(
+        cls, lines: List[str], node: ScalarNode
+    ) -> Tuple[int, int, int]:
+        """
+        Get position of the entry body in config.
+
+        :param lines: config lines
+        :type lines: List[str]
+        :param node: entry node
+        :type node: ScalarNode
+        :return: line and column of the body start and column of its other lines
+        :rtype: Tuple[int, int, int]
+        """
+        start = node.start_mark
+        if node.style in ("|", ">"):
+            # block scalar body starts on the next line with the block indentation
+            first, last = start.line + 1, node.end_mark.line + 1
+            indent = cls._get_block_indent(lines[first:last])
+            return start.line + 1, indent, indent
+        quote = 1 if node.style in ("'", '"') else 0
+
+        return start.line, start.column + quote, 0
+
+    @classmethod
+    def _create_hook(
+        cls,
+        lines: List[str],
+        node: Node,
+        offset: Tuple[int, int],
+        span: Tuple[int, Union[int, None]],  # noqa: SIM907
+    ) -> Dict[str, Any]:
+        """
+        Create hook data from its node.
+
+        :param lines: lines of the parsed text
+        :type lines: List[str]
+        :param node: hook node
+        :type node: Node
+        :param offset: line and column of the parsed text in config
+        :type offset: Tuple[int, int]
+        :param span: end line of the hook in config and its keys column,
+            None if hook could not be parsed alone
+        :type span: Tuple[int, Union[int, None]]
+        :return: hook lines, entry body and entry body position in config
+        :rtype: Dict[str, Any]
+        """
+        hook: Dict[str, Any] = {
+            "start": node.start_mark.line + offset[0],
+            "end": span[0],
+            "column": span[1],
+            "entry": None,
+            "origin": None,
+        }
+        entry = cls._get_value(node, "entry")
+        if isinstance(entry, ScalarNode):
+            line, column, other = cls._get_entry_origin(lines, entry)
+            hook["entry"] = entry.value
+            # other lines of flow scalars are not indented by the block indentation
+            if entry.style in ("|", ">"):
+                other += offset[1]
+            hook["origin"] = (line + offset[0], column + offset[1], other)
+
+        return hook
+
+    @staticmethod
+    def _compose_documents(text: str) -> List[Node]:
+        """
+        Compose nodes of all config documents.
+
+        :param text: config text
+        :type text: str
+        :return: documents root nodes
+        :rtype: List[Node]
+        """
+        loader = CustomYamlLoader(text)
+        documents = []
+        while loader.check_node():
+            documents.append(cast(Node, loader.get_node()))
+
+        return documents
+
+    @classmethod
+    def _get_hook_nodes(cls, document: Node) -> List[Node]:
+        """
+        Get hooks nodes of all repositories of config document.
+
+        :param document: document root node
+        :type document: Node
+        :return: hooks nodes
+        :rtype: List[Node]
+        """
+        repositories = cls._get_value(document, "repos")
+        nodes: List[Node] = []
+        for repository in getattr(repositories, "value", None) or []:
+            hooks = cls._get_value(repository, "hooks")
+            nodes += getattr(hooks, "value", None) or []
+
+        return nodes
+
+    @staticmethod
+    def _get_hook_span(
+        text: str, lines: List[str], hook: Node, alone: bool
+    ) -> Tuple[int, Union[int, None]]:  # noqa: SIM907
+        """
+        Get end line and keys column of hook.
+
+        :param text: config text
+        :type text: str
+        :param lines: config lines
+        :type lines: List[str]
+        :param hook: hook node
+        :type hook: Node
+        :param alone: whether document hooks do not share nodes
+        :type alone: bool
+        :return: end line of the hook and its keys column,
+            None if hook could not be parsed alone
+        :rtype: Tuple[int, Union[int, None]]
+        """
+        # block mapping ends where the next token starts
+        end = len(lines) if hook.end_mark.index == len(text) else hook.end_mark.line
+        block = isinstance(hook, MappingNode) and not hook.flow_style
+
+        return end, hook.start_mark.column if alone and block else None
+
+    @classmethod
+    def _parse_hooks(cls, text: str, lines: List[str]) -> List[Dict[str, Any]]:
+        """
+        Parse all hooks of config.
+
+        :param text: config text
+        :type text: str
+        :param lines: config lines
+        :type lines: List[str]
+        :return: hooks data
+        :rtype: List[Dict[str, Any]]
+        """
+        result = []
+        for document in cls._compose_documents(text):
+            # hook sharing nodes with other ones can't be parsed alone
+            alone = not cls._has_aliases(document)
+            for hook in cls._get_hook_nodes(document):
+                span = cls._get_hook_span(text, lines, hook, alone)
+                result.append(cls._create_hook(lines, hook, (0, 0), span))
+
+        return result
+
+    @staticmethod
+    def _dedent_line(line: str, column: int) -> Union[str, None]:  # noqa: SIM907
+        """
+        Remove hook mapping indentation from its line.
+
+        :param line: hook line
+        :type line: str
+        :param column: hook keys column
+        :type column: int
+        :return: dedented line or None if line ends the hook mapping
+        :rtype: Union[str, None]
+        """
+        content = line.lstrip(" ")
+        indent = len(line) - len(content)
+        # less indented content ends the hook mapping
+        if content and not content.startswith("#") and indent < column:
+            return None
+
+        return line[column:] if indent >= column else content
+
+    @classmethod
+    def _cut_hook(
+        cls, lines: List[str], hook: Dict[str, Any], end: int, first: str
+    ) -> Union[List[str], None]:  # noqa: SIM907
+        """
+        Cut edited hook lines out of config removing their indentation.
+
+        :param lines: config lines
+        :type lines: List[str]
+        :param hook: previous hook data
+        :type hook: Dict[str, Any]
+        :param end: end line of the edited hook
+        :type end: int
+        :param first: previous first line of the hook
+        :type first: str
+        :return: hook lines or None if edit could change other hooks
+        :rtype: Union[List[str], None]
+        """
+        column = hook["column"]
+        region = lines[hook["start"] : end]  # noqa: E203
+        if not region or region[0][:column] != first[:column]:
+            return None
+        snippet = [cls._dedent_line(line, column) for line in region[1:]]
+        if None in snippet:
+            return None
+
+        return [region[0][column:], *cast(List[str], snippet)]
+
+    @staticmethod
+    def _compose_hook(text: str) -> Union[MappingNode, None]:  # noqa: SIM907
+        """
+        Compose node of single hook.
+
+        :param text: hook text
+        :type text: str
+        :return: hook node or None if text is not a single block mapping
+        :rtype: Union[MappingNode, None]
+        """
+        try:
+            node = CustomYamlLoader(text).get_single_node()
+        except MarkedYAMLError:
+            return None
+        block = isinstance(node, MappingNode) and not node.flow_style
+
+        return cast(MappingNode, node) if block else None
+
+    @classmethod
+    def _parse_hook(
+        cls, lines: List[str], hook: Dict[str, Any], end: int, first: str
+    ) -> Union[Dict[str, Any], None]:  # noqa: SIM907
+        """
+        Parse single edited hook.
+
+        :param lines: config lines
+        :type lines: List[str]
+        :param hook: previous hook data
+        :type hook: Dict[str, Any]
+        :param end: end line of the edited hook
+        :type end: int
+        :param first: previous first line of the hook
+        :type first: str
+        :return: hook data or None if edit could change other hooks
+        :rtype: Union[Dict[str, Any], None]
+        """
+        snippet = cls._cut_hook(lines, hook, end, first)
+        # keep line break after the hook, it matters for block scalars chomping
+        text = "\n".join(snippet or []) + ("\n" if end < len(lines) else "")
+        node = cls._compose_hook(text) if snippet else None
+        if node is None:
+            return None
+        offset = hook["start"], hook["column"]
+
+        return cls._create_hook(
+            cast(List[str], snippet), node, offset, (end, offset[1])
+        )
+
+    @staticmethod
+    def _get_edit(old: List[str], lines: List[str]) -> Tuple[int, int]:
+        """
+        Get numbers of lines not changed at the start and at the end of config.
+
+        :param old: previous config lines
+        :type old: List[str]
+        :param lines: config lines
+        :type lines: List[str]
+        :return: numbers of common leading and trailing lines
+        :rtype: Tuple[int, int]
+        """
+        limit = min(len(old), len(lines))
+        prefix = 0
+        while prefix < limit and old[prefix] == lines[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old[-1 - suffix] == lines[-1 - suffix]:
+            suffix += 1
+
+        return prefix, suffix
+
+    @staticmethod
+    def _find_edited_hook(
+        hooks: List[Dict[str, Any]], prefix: int, end: int, delta: int
+    ) -> Union[int, None]:  # noqa: SIM907
+        """
+        Find the hook containing the whole edit.
+
+        :param hooks: previous hooks data
+        :type hooks: List[Dict[str, Any]]
+        :param prefix: first edited line
+        :type prefix: int
+        :param end: line after the last edited line before the edit
+        :type end: int
+        :param delta: number of added lines, negative for removed ones
+        :type delta: int
+        :return: index of the hook or None if the edit is not within a single hook
+        :rtype: Union[int, None]
+        """
+        starts = [
+            index
+            for index, hook in enumerate(hooks)
+            if hook["column"] is not None and hook["start"] <= prefix < hook["end"]
+        ]
+        hook = hooks[starts[0]] if starts else {"start": 0, "end": -1}
+        # the edit can't reach the next hook or remove all the hook lines
+        within = end <= hook["end"] and hook["end"] + delta > hook["start"]
+
+        return starts[0] if within else None
+
+    @staticmethod
+    def _shift_hook(hook: Dict[str, Any], delta: int) -> Dict[str, Any]:
+        """
+        Move hook placed after the edited one.
+
+        :param hook: hook data
+        :type hook: Dict[str, Any]
+        :param delta: number of added lines, negative for removed ones
+        :type delta: int
+        :return: moved hook data
+        :rtype: Dict[str, Any]
+        """
+        shifted = dict(hook, start=hook["start"] + delta, end=hook["end"] + delta)
+        if hook["origin"]:
+            line, column, indent = hook["origin"]
+            shifted["origin"] = (line + delta, column, indent)
+
+        return shifted
+
+    @classmethod
+    def _replace_hook(
+        cls, previous: Dict[str, Any], lines: List[str], index: int, delta: int
+    ) -> Union[List[Dict[str, Any]], None]:  # noqa: SIM907
+        """
+        Parse edited hook and move the following ones.
+
+        :param previous: previous config lines and hooks
+        :type previous: Dict[str, Any]
+        :param lines: config lines
+        :type lines: List[str]
+        :param index: index of the edited hook
+        :type index: int
+        :param delta: number of added lines, negative for removed ones
+        :type delta: int
+        :return: hooks data or None if edit could change other hooks
+        :rtype: Union[List[Dict[str, Any]], None]
+        """
+        hooks = previous["hooks"]
+        hook = hooks[index]
+        first = previous["lines"][hook["start"]]
+        edited = cls._parse_hook(lines, hook, hook["end"] + delta, first)
+        if edited is None:
+            return None
+        following = hooks[index + 1 :]  # noqa: E203
+        shifted = [cls._shift_hook(other, delta) for other in following]
+
+        return [*hooks[:index], edited, *shifted]
+
+    @classmethod
+    def _reparse_hooks(
+        cls, previous: Dict[str, Any], lines: List[str]
+    ) -> Union[List[Dict[str, Any]], None]:  # noqa: SIM907
+        """
+        Parse only the hook edited since the previous parse.
+
+        :param previous: previous config lines and hooks
+        :type previous: Dict[str, Any]
+        :param lines: config lines
+        :type lines: List[str]
+        :return: hooks data or None if the edit is not within a single hook
+        :rtype: Union[List[Dict[str, Any]], None]
+        """
+        old, hooks = previous["lines"], previous["hooks"]
+        prefix, suffix = cls._get_edit(old, lines)
+        if prefix == len(old) == len(lines):
+            return list(hooks)
+        # edited lines are [prefix, end) before and [prefix, end + delta) after
+        end, delta = len(old) - suffix, len(lines) - len(old)
+        index = cls._find_edited_hook(hooks, prefix, end, delta)
+
+        return (
+            None if index is None else cls._replace_hook(previous, lines, index, delta)
+        )
+
+    def _get_hooks(self, uri: str, text: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Parse edited hooks of document reusing its previous parse.
+
+        :param uri: document URI
+        :type uri: str
+        :param text: document text
+        :type text: str
+        :return: document lines and hooks
+        :rtype: Tuple[List[str], List[Dict[str, Any]]]
+        """
+        lines = self.LINE_BREAK.split(text)
+        previous = self.parsed.get(uri)
+        hooks = self._reparse_hooks(previous, lines) if previous else None
+        if hooks is None:
+            hooks = self._parse_hooks(text, lines)
+        self.parsed[uri] = {"lines": lines, "hooks": hooks}
+
+        return lines, hooks
+
+    @classmethod
+    def _get_position(
+        cls, lines: List[str], origin: Tuple[int, int, int], line: int, column: int
+    ) -> Dict[str, int]:
+        """
+        Convert position in checked script to LSP position in config.
+
+        :param lines: config lines
+        :type lines: List[str]
+        :param origin: position of the entry body in config
+        :type origin: Tuple[int, int, int]
+        :param line: script line number
+        :type line: int
+        :param column: script column number
+        :type column: int
+        :return: LSP position
+        :rtype: Dict[str, int]
+        """
+        # subtract 1 because of shebang line in checked script
+        line = max(line - 1, 1)
+        number = origin[0] + line - 1
+        indent = origin[1] if line == 1 else origin[2]
+        index = indent + column - 1
+        source = lines[number] if number < len(lines) else ""
+
+        return {"line": number, "character": cls._get_character(source, index)}
+
+    def _create_diagnostic(
+        self, lines: List[str], hook: Dict[str, Any], comment: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Create LSP diagnostic from ShellCheck comment of hook entry.
+
+        :param lines: config lines
+        :type lines: List[str]
+        :param hook: hook data
+        :type hook: Dict[str, Any]
+        :param comment: ShellCheck comment
+        :type comment: Dict[str, Any]
+        :return: diagnostic
+        :rtype: Dict[str, Any]
+        """
+        origin = hook["origin"]
+        start = self._get_position(lines, origin, comment["line"], comment["column"])
+        end = self._get_position(
+            lines, origin, comment["endLine"], comment["endColumn"]
+        )
+
+        return {
+            "range": {"start": start, "end": end},
+            "severity": self.SEVERITIES.get(comment["level"], 2),
+            "code": f"SC{comment['code']}",
+            "source": "shellcheck",
+            "message": comment["message"],
+        }
+
+    def _create_diagnostics(
+        self, lines: List[str], hooks: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Create LSP diagnostics of config from ShellCheck comments of its entries.
+
+        :param lines: config lines
+        :type lines: List[str]
+        :param hooks: hooks data
+        :type hooks: List[Dict[str, Any]]
+        :return: diagnostics
+        :rtype: List[Dict[str, Any]]
+        """
+        return [
+            self._create_diagnostic(lines, hook, comment)
+            for hook in hooks
+            for comment in self.results.get(hook["entry"], [])
+        ]
+
+    @staticmethod
+    def _create_yaml_diagnostics(err: yaml.YAMLError) -> List[Dict[str, Any]]:
+        """
+        Create LSP diagnostics of config which could not be parsed.
+
+        Errors without mark, like unacceptable characters, are reported
+        at the document start.
+
+        :param err: YAML error
+        :type err: yaml.YAMLError
+        :return: diagnostics
+        :rtype: List[Dict[str, Any]]
+        """
+        position = {"line": 0, "character": 0}
+        message = str(err)
+        if isinstance(err, MarkedYAMLError):
+            mark = err.problem_mark or err.context_mark
+            if mark:
+                position = {"line": mark.line, "character": mark.column}
+            message = str(err.problem or err.context)
+
+        return [
+            {
+                "range": {"start": position, "end": position},
+                "severity": 1,
+                "source": "yaml",
+                "message": message,
+            }
+        ]
+
+    def _is_current(self, uri: str, revision: int) -> bool:
+        """
+        Check if document was not changed or closed since the revision.
+
+        :param uri: document URI
+        :type uri: str
+        :param revision: document revision
+        :type revision: int
+        :return: whether the revision is current
+        :rtype: bool
+        """
+        with self.condition:
+            return self.revisions.get(uri) == revision
+
+    def _log(self, message: str) -> None:
+        """
+        Send error message to the client log.
+
+        :param message: message to log
+        :type message: str
+        """
+        self.write_message(
+            {"method": "window/logMessage", "params": {"type": 1, "message": message}}
+        )
+
+    def _store_result(self, body: str, stdout: bytes, stderr: bytes) -> None:
+        """
+        Store ShellCheck comments of the entry body.
+
+        :param body: entry body
+        :type body: str
+        :param stdout: shellcheck output in json1 format
+        :type stdout: bytes
+        :param stderr: shellcheck errors
+        :type stderr: bytes
+        """
+        if stderr:
+            self._log(stderr.decode("utf-8"))
+            return
+        try:
+            comments = json.loads(stdout)["comments"]
+        except (ValueError, KeyError, TypeError) as err:
+            self._log(f"Failed to parse ShellCheck output: {err!r}")
+            return
+        while len(self.results) >= self.RESULTS_LIMIT:
+            del self.results[next(iter(self.results))]
+        self.results[body] = comments
+
+    def _start_shellcheck(
+        self,
+        executor: concurrent.futures.ThreadPoolExecutor,
+        queue: Deque[str],
+        running: RunningChecks,
+    ) -> None:
+        """
+        Start ShellCheck processes for queued entries bodies while limit allows.
+
+        Bodies are sent to processes right away in separate threads,
+        so all started processes run at once.
+
+        :param executor: threads communicating with processes
+        :type executor: concurrent.futures.ThreadPoolExecutor
+        :param queue: entries bodies to check
+        :type queue: Deque[str]
+        :param running: processes and entries bodies by their future outputs
+        :type running: RunningChecks
+        """
+        while queue and len(running) < self.concurrency.limit:
+            body = queue.popleft()
+            process = subprocess.Popen(  # nosec
+                args=[self.shellcheck, "--format=json1", "-"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            script = f"#!/bin/sh\n{body}".encode("utf-8")
+            running[executor.submit(process.communicate, script)] = process, body
+
+    def _run_shellcheck(self, bodies: List[str], uri: str, revision: int) -> bool:
+        """
+        Check entries bodies with ShellCheck until document changes.
+
+        :param bodies: entries bodies to check
+        :type bodies: List[str]
+        :param uri: URI of the checked document
+        :type uri: str
+        :param revision: revision of the checked document
+        :type revision: int
+        :return: whether all bodies were checked
+        :rtype: bool
+        """
+        queue: Deque[str] = deque(bodies)
+        running: RunningChecks = {}
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.concurrency.limit
+        )
+        try:
+            while queue or running:
+                self._start_shellcheck(executor, queue, running)
+                if not self._collect_shellcheck(running, uri, revision):
+                    return False
+        finally:
+            self._kill_shellcheck(running)
+            # killed processes children could still hold their output open
+            executor.shutdown(wait=False)
+
+        return True
+
+    @staticmethod
+    def _kill_shellcheck(running: RunningChecks) -> None:
+        """
+        Kill ShellCheck processes of superseded document revision.
+
+        :param running: processes and entries bodies by their future outputs
+        :type running: RunningChecks
+        """
+        for process, _ in running.values():
+            process.kill()
+            process.wait()
+
+    def _collect_shellcheck(
+        self,
+        running: RunningChecks,
+        uri: str,
+        revision: int,
+    ) -> bool:
+        """
+        Store results of finished ShellCheck processes.
+
+        :param running: processes and entries bodies by their future outputs
+        :type running: RunningChecks
+        :param uri: URI of the checked document
+        :type uri: str
+        :param revision: revision of the checked document
+        :type revision: int
+        :return: whether document is not changed meanwhile
+        :rtype: bool
+        """
+        done, _ = concurrent.futures.wait(
+            running,
+            timeout=self.POLL_INTERVAL,
+            return_when=concurrent.futures.FIRST_COMPLETED,
+        )
+        for future in done:
+            _, body = running.pop(future)
+            self._store_result(body, *future.result())
+
+        return bool(done) or self._is_current(uri, revision)
+
+    def _get_unchecked_bodies(self, hooks: List[Dict[str, Any]]) -> List[str]:
+        """
+        Get entries bodies without stored ShellCheck comments.
+
+        :param hooks: hooks data
+        :type hooks: List[Dict[str, Any]]
+        :return: unique entries bodies
+        :rtype: List[str]
+        """
+        bodies = [hook["entry"] for hook in hooks if hook["entry"] is not None]
+
+        return [body for body in dict.fromkeys(bodies) if body not in self.results]
+
+    def _check_hooks(
+        self, uri: str, revision: int, lines: List[str], hooks: List[Dict[str, Any]]
+    ) -> Union[List[Dict[str, Any]], None]:  # noqa: SIM907
+        """
+        Check hooks entries with ShellCheck.
+
+        :param uri: document URI
+        :type uri: str
+        :param revision: document revision
+        :type revision: int
+        :param lines: document lines
+        :type lines: List[str]
+        :param hooks: document hooks
+        :type hooks: List[Dict[str, Any]]
+        :return: diagnostics or None if document changed or ShellCheck is missing
+        :rtype: Union[List[Dict[str, Any]], None]
+        """
+        try:
+            checked = self._run_shellcheck(
+                self._get_unchecked_bodies(hooks), uri, revision
+            )
+        except FileNotFoundError:
+            message = f"No shellcheck found: '{self.shellcheck}'"
+            self.write_message(
+                {
+                    "method": "window/showMessage",
+                    "params": {"type": 1, "message": message},
+                }
+            )
+            return None
+
+        return self._create_diagnostics(lines, hooks) if checked else None
+
+    def _lint(self, uri: str, text: str, revision: int) -> None:
+        """
+        Check document and publish its diagnostics unless it changes meanwhile.
+
+        :param uri: document URI
+        :type uri: str
+        :param text: document text
+        :type text: str
+        :param revision: document revision
+        :type revision: int
+        """
+        diagnostics: Union[List[Dict[str, Any]], None]  # noqa: SIM907
+        try:
+            lines, hooks = self._get_hooks(uri, text)
+        except yaml.YAMLError as err:
+            diagnostics = self._create_yaml_diagnostics(err)
+        else:
+            diagnostics = self._check_hooks(uri, revision, lines, hooks)
+        if diagnostics is not None and self._is_current(uri, revision):
+            self.write_message(
+                {
+                    "method": "textDocument/publishDiagnostics",
+                    "params": {"uri": uri, "diagnostics": diagnostics},
+                }
+            )
+
+    def _get_delay(self) -> float:
+        """
+        Get time left until the earliest pending document is checked.
+
+        :return: delay, infinite if nothing is pending and zero if server stops
+        :rtype: float
+        """
+        if self.stopping:
+            return 0.0
+        changed = min(self.pending.values(), default=math.inf)
+
+        return changed + self.DEBOUNCE - time.monotonic()
+
+    def _take_document(self) -> Union[Tuple[str, str, int], None]:  # noqa: SIM907
+        """
+        Wait until the earliest pending document is due to be checked.
+
+        :return: document URI, text and revision or None if server stops
+        :rtype: Union[Tuple[str, str, int], None]
+        """
+        with self.condition:
+            delay = self._get_delay()
+            while delay > 0:
+                self.condition.wait(None if math.isinf(delay) else delay)
+                delay = self._get_delay()
+            if not self.pending:
+                return None
+            uri = min(self.pending, key=self.pending.__getitem__)
+            del self.pending[uri]
+
+            return uri, self.documents[uri], self.revisions[uri]
+
+    def _work(self) -> None:
+        """Check changed documents after debounce delay until server stops."""
+        document = self._take_document()
+        while document is not None:
+            # a broken revision must not stop checking the next ones
+            try:
+                self._lint(*document)
+            except Exception as err:
+                self._log(f"Failed to check {document[0]}: {err!r}")
+            document = self._take_document()
+
+    def _update(self, uri: str, text: Union[str, None]) -> None:  # noqa: SIM907
+        """
+        Store document text and schedule its check.
+
+        :param uri: document URI
+        :type uri: str
+        :param text: document text or None if document was closed
+        :type text: Union[str, None]
+        """
+        with self.condition:
+            if text is None:
+                self.documents.pop(uri, None)
+                self.revisions.pop(uri, None)
+                self.pending.pop(uri, None)
+                self.parsed.pop(uri, None)
+            else:
+                self.documents[uri] = text
+                self.revisions[uri] = self.revisions.get(uri, 0) + 1
+                self.pending[uri] = time.monotonic()
+            self.condition.notify()
+
+    def _stop(self) -> None:
+        """Check pending documents without delay and stop worker."""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.worker.join()
+
+    def _initialize(self, message: Dict[str, Any]) -> None:
+        """
+        Respond to initialize request with server capabilities.
+
+        :param message: client request
+        :type message: Dict[str, Any]
+        """
+        self.write_message(
+            {
+                "id": message["id"],
+                "result": {
+                    "capabilities": {
+                        "textDocumentSync": {"openClose": True, "change": 2}
+                    },
+                    "serverInfo": {
+                        "name": "pre-commit-config-shellcheck",
+                        "version": __version__,
+                    },
+                },
+            }
+        )
+
+    def _shutdown(self, message: Dict[str, Any]) -> None:
+        """
+        Check pending documents and respond to shutdown request.
+
+        :param message: client request
+        :type message: Dict[str, Any]
+        """
+        self._stop()
+        self.shutdown = True
+        self.write_message({"id": message["id"], "result": None})
+
+    def _open(self, message: Dict[str, Any]) -> None:
+        """
+        Schedule check of opened document.
+
+        :param message: client notification
+        :type message: Dict[str, Any]
+        """
+        document = message["params"]["textDocument"]
+        self._update(document["uri"], document["text"])
+
+    def _change(self, message: Dict[str, Any]) -> None:
+        """
+        Apply document changes and schedule its check.
+
+        :param message: client notification
+        :type message: Dict[str, Any]
+        """
+        uri = message["params"]["textDocument"]["uri"]
+        text = self.documents.get(uri, "")
+        for change in message["params"]["contentChanges"]:
+            text = self.apply_change(text, change)
+        self._update(uri, text)
+
+    def _close(self, message: Dict[str, Any]) -> None:
+        """
+        Forget closed document and clear its diagnostics.
+
+        :param message: client notification
+        :type message: Dict[str, Any]
+        """
+        uri = message["params"]["textDocument"]["uri"]
+        self._update(uri, None)
+        self.write_message(
+            {
+                "method": "textDocument/publishDiagnostics",
+                "params": {"uri": uri, "diagnostics": []},
+            }
+        )
+
+    def _reject(self, message: Dict[str, Any]) -> None:
+        """
+        Respond to unknown request with error, unknown notifications are ignored.
+
+        :param message: client message
+        :type message: Dict[str, Any]
+        """
+        method = message.get("method")
+        if "id" in message and method is not None:
+            self.write_message(
+                {
+                    "id": message["id"],
+                    "error": {"code": -32601, "message": f"Unknown method: {method}"},
+                }
+            )
+
+    def serve(self) -> bool:
+        """
+        Handle client messages until exit notification.
+
+        :return: whether client requested shutdown before exit
+        :rtype: bool
+        """
+        handlers: Dict[str, Callable[[Dict[str, Any]], None]] = {
+            "initialize": self._initialize,
+            "shutdown": self._shutdown,
+            "textDocument/didOpen": self._open,
+            "textDocument/didChange": self._change,
+            "textDocument/didClose": self._close,
+        }
+        self.worker.start()
+        message = self.read_message()
+        while message is not None and message.get("method") != "exit":
+            handlers.get(str(message.get("method")), self._reject)(message)
+            message = self.read_message()
+        self._stop()
+
+        return self.shutdown
+
+
+class PreCommitConfigShellcheck:
+    """Tool for shellchecking pre-commit config files."""
+
+    EXIT_CODE_SUCCESS: int = 0
+    EXIT_CODE_ERROR: int = 2
+    EXIT_CODE_FILE_NOT_FOUND: int = 5
+    PARTIAL_RESULT_VERSION: int = 1
+    DURATIONS_FILE: str = "durations.json"
+    DURATIONS_LIMIT: int = 10000
+    # options which do not affect the tool output and are not part of the cache key
+    CACHE_IGNORED_OPTIONS: Tuple[str, ...] = (
+        "path",
+        "cache_dir",
+        "max_jobs",
+        "diagnostics",
+        "metrics_file",
+        "launcher",
+    )
+    ARCHIVE_SUFFIXES: Tuple[str, ...] = (
+        ".tar",
+        ".tar.gz",
+        ".tgz",
+        ".tar.bz2",
+        ".tar.xz",
+        ".zip",
+    )
+    # name of archive members to check
+    ARCHIVE_MEMBER: str = ".pre-commit-config.yaml"
+    # entries consisting only of these characters have no quoting, expansions,
+    # globs, redirections, pipes, command lists, substitutions or comments
+    PREFILTER_CHARACTERS: Pattern[str] = re.compile(r"[A-Za-z0-9_./:=@+,\- \n]*")
+    # shell keywords, builtins and commands ShellCheck has checks for
+    PREFILTER_WORDS: FrozenSet[str] = frozenset(
+        {
+            # keywords
+            "case",
+            "coproc",
+            "do",
+            "done",
+            "elif",
+            "else",
+            "elseif",
+            "elsif",
+            "esac",
+            "fi",
+            "for",
+            "function",
+            "if",
+            "in",
+            "select",
+            "then",
+            "time",
+            "until",
+            "while",
+            # builtins
+            ".",
+            ":",
+            "alias",
+            "bg",
+            "bind",
+            "break",
+            "builtin",
+            "caller",
+            "cd",
+            "command",
+            "compgen",
+            "complete",
+            "compopt",
+            "continue",
+            "declare",
+            "dirs",
+            "disown",
+            "echo",
+            "enable",
+            "eval",
+            "exec",
+            "exit",
+            "export",
+            "fc",
+            "fg",
+            "getopts",
+            "hash",
+            "help",
+            "history",
+            "jobs",
+            "kill",
+            "let",
+            "local",
+            "logout",
+            "mapfile",
+            "popd",
+            "printf",
+            "pushd",
+            "pwd",
+            "read",
+            "readarray",
+            "readonly",
+            "return",
+            "set",
+            "shift",
+            "shopt",
+            "source",
+            "suspend",
+            "test",
+            "times",
+            "trap",
+            "type",
+            "typeset",
+            "ulimit",
+            "umask",
+            "unalias",
+            "unset",
+            "wait",
+            # commands
+            "awk",
+            "bash",
+            "busybox",
+            "cat",
+            "chmod",
+            "cp",
+            "dash",
+            "egrep",
+            "env",
+            "expr",
+            "fgrep",
+            "find",
+            "getopt",
+            "grep",
+            "ksh",
+            "ln",
+            "ls",
+            "mkdir",
+            "mv",
+            "nohup",
+            "ps",
+            "rm",
+            "sed",
+            "seq",
+            "sh",
+            "ssh",
+            "su",
+            "sudo",
+            "tempfile",
+            "timeout",
+            "tr",
+            "wc",
+            "which",
+            "xargs",
+            "zsh",
+        }
+    )
+
+    def __init__(self):
+        """Get command line args."""
+        self.options: Namespace = self._get_options()
+        self._source: Dict[str, Union[int, str]] = {}
+        self.metrics = Metrics(enabled=bool(self.options.metrics_file))
+        self.launcher = ProcessLauncher()
+
+    @staticmethod
+    def _get_options() -> Namespace:
+        """
+        Parse commandline options arguments.
+
+        :return: parsed command line arguments
+        :rtype: Namespace
+        """
+        parser: ArgumentParser = ArgumentParser(
+            description="Tool for checking entry points in the pre-commit config with ShellCheck."  # noqa: E501
+        )
+
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=".pre-commit-config.yaml",
+            action="store",
+            metavar="PATH",
+            help="file or tar/zip archive to check, '-' for stdin",
+        )
+        parser.add_argument(
+            "-s",
+            "--shellcheck",
+            action="store",
+            dest="shellcheck",
+            type=str,
+            default="shellcheck",
+            metavar="SHELLCHECK",
+            help="ShellCheck path",
+        )
+        PreCommitConfigShellcheck._add_run_arguments(parser=parser)
+        parser.add_argument(
+            "-v",
+            "--version",
+            action="version",
+            version=f"{__version__}",
+        )
+        PreCommitConfigShellcheck._add_mode_arguments(parser=parser)
+        parser.set_defaults(command="check")
+
+        options, rest = parser.parse_known_args()
+        # "merge" followed by partial results files is the merge command,
+        # a config named "merge" alone is still checked
+        if options.path == "merge" and rest:
+            return PreCommitConfigShellcheck._get_merge_options(
+                parser=parser, options=options, args=rest
+            )
+        if rest:
+            parser.error(f"unrecognized arguments: {' '.join(rest)}")
+
+        return options
+
+    @staticmethod
+    def _add_run_arguments(parser: ArgumentParser) -> None:
+        """
+        Add options of checking entries.
+
+        :param parser: commandline options parser
+        :type parser: ArgumentParser
+        """
+        parser.add_argument(
+            "-c",
+            "--cache-dir",
+            action="store",
+            dest="cache_dir",
+            type=str,
+            default=None,
+            metavar="CACHE_DIR",
+            help="directory to keep results of the previous runs in",
+        )
+        parser.add_argument(
+            "-f",
+            "--fail-fast",
+            action="store_true",
+            dest="fail_fast",
+            default=False,
+            help="stop at the first entry with issues",
+        )
+        parser.add_argument(
+            "-j",
+            "--max-jobs",
+            action="store",
+            dest="max_jobs",
+            type=int,
+            default=None,
+            metavar="MAX_JOBS",
+            help="maximum number of concurrently running ShellCheck processes",
+        )
+        parser.add_argument(
+            "-d",
+            "--diagnostics",
+            action="store_true",
+            dest="diagnostics",
+            default=False,
+            help="write tool diagnostics to stderr",
+        )
+        parser.add_argument(
+            "--no-prefilter",
+            action="store_false",
+            dest="prefilter",
+            default=True,
+            help="check trivially clean entries with ShellCheck too",
+        )
+        parser.add_argument(
+            "-m",
+            "--metrics-file",
+            action="store",
+            dest="metrics_file",
+            type=str,
+            default=None,
+            metavar="METRICS_FILE",
+            help="file to write metrics in Prometheus text format to",
+        )
+
+    @staticmethod
+    def _add_mode_arguments(parser: ArgumentParser) -> None:
+        """
+        Add options of running modes and processes launcher.
+
+        :param parser: commandline options parser
+        :type parser: ArgumentParser
+        """
+        parser.add_argument(
+            "--shard",
+            action="store",
+            dest="shard",
+            type=PreCommitConfigShellcheck._get_shard,
+            default=None,
+            metavar="INDEX/COUNT",
+            help="check only a part of entries and write partial result to merge",
+        )
+        parser.add_argument(
+            "--history",
+            action="store",
+            dest="history",
+            type=str,
+            default=None,
+            metavar="REVISION_RANGE",
+            help="report when issues appeared or disappeared in the git revisions",
+        )
+        parser.add_argument(
+            "--launcher",
+            action="store",
+            dest="launcher",
+            choices=["spawn", "popen"],
+            default="spawn" if ProcessLauncher.is_supported() else "popen",
+            help="start shellcheck processes with posix_spawn or subprocess.Popen",
+        )
+        parser.add_argument(
+            "--lsp",
+            action="store_true",
+            dest="lsp",
+            default=False,
+            help="run language server publishing diagnostics of edited configs",
+        )
+
+    @staticmethod
+    def _get_merge_options(
+        parser: ArgumentParser, options: Namespace, args: List[str]
+    ) -> Namespace:
+        """
+        Parse merge command options arguments.
+
+        :param parser: main commandline options parser
+        :type parser: ArgumentParser
+        :param options: main commandline options given with the command
+        :type options: Namespace
+        :param args: arguments not recognized by the main parser
+        :type args: List[str]
+        :return: parsed command line arguments
+        :rtype: Namespace
+        """
+        merge_parser: ArgumentParser = ArgumentParser(
+            prog=f"{parser.prog} merge",
+            description="Merge partial results of the sharded runs.",
+        )
+        merge_parser.add_argument(
+            "partials",
+            nargs="+",
+            action="store",
+            metavar="PARTIAL",
+            help="partial result file",
+        )
+        options = merge_parser.parse_args(args, namespace=options)
+        options.command = "merge"
+
+        return options
+
+    @staticmethod
+    def _get_shard(value: str) -> Tuple[int, int]:
+        """
+        Parse shard option value.
+
+        :param value: shard in INDEX/COUNT format
+        :type value: str
+        :return: shard index and shards count
+        :rtype: Tuple[int, int]
+        :raises ArgumentTypeError: if value has wrong format
+        """
+        try:
+            index, count = map(int, value.split("/"))
+        except ValueError:
+            raise ArgumentTypeError(f"invalid shard: '{value}'")
+        if not 0 <= index < count:
+            raise ArgumentTypeError(f"invalid shard: '{value}'")
+
+        return index, count
+
+    def _read_file(self) -> bytes:
+        """
+        Read requested file or stdin.
+
+        :return: file content
+        :rtype: bytes
+        """
+        if self.options.path == "-":
+            return sys.stdin.buffer.read()
+        with open(self.options.path, "rb") as stream:
+            stat = os.fstat(stream.fileno())
+            content = stream.read()
+        self._source = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": hashlib.sha256(content).hexdigest(),
+        }
+
+        return content
+
+    @staticmethod
+    def _load_documents(content: bytes) -> List[Any]:
+        """
+        Load all documents of YAML stream.
+
+        :param content: YAML stream
+        :type content: bytes
+        :return: parsed documents
+        :rtype: List[Any]
+        """
+        documents = yaml.load_all(  # nosec  # noqa: DUO109
+            stream=content, Loader=CustomYamlLoader
+        )
+
+        return list(documents)
+
+    def _parse_documents(self) -> List[Any]:
+        """
+        Parse all documents of requested file.
+
+        :return: parsed configs
+        :rtype: List[Any]
+        """
+        try:
+            return self._load_documents(self._read_file())
+        except FileNotFoundError:
+            sys.stderr.write(f"No file {self.options.path} found\n")
+            sys.exit(self.EXIT_CODE_FILE_NOT_FOUND)
+        except ScannerError:
+            sys.stderr.write(f"{self.options.path} is not a YAML file\n")
+            sys.exit(self.EXIT_CODE_ERROR)
+
+    @staticmethod
+    def _extract_entries(data: Dict[str, Any]) -> List[Entry]:  # noqa: CCR001
+        """
+        Extract all entries from provided config.
+
+        :param data: constructed mapping of file
+        :type data: Dict[str, Any]
+        :return: list of ids and entries with number of lines they are attached to
+        :rtype: List[Entry]
+        """
+        result: List[Entry] = []
+        for repository in data.get("repos", []):
+            for hook in repository.get("hooks", []):
+                if "entry" in hook:
+                    result.append(
+                        {
+                            "id": {"line": hook["__line__id"], "id": hook["id"]},
+                            "entry": {
+                                "line": hook["__line__entry"],
+                                "entry": hook["entry"],
+                            },
+                        }
+                    )
+
+        return result
+
+    def _find_entries(
+        self, data: Dict[str, Any], source: Union[str, None] = None  # noqa: SIM907
+    ) -> List[Entry]:
+        """
+        Find all entries in provided config.
+
+        :param data: constructed mapping of file
+        :type data: Dict[str, Any]
+        :param source: archive member the config was read from
+        :type source: Union[str, None]
+        :return: list of ids and entries with number of lines they are attached to
+        :rtype: List[Entry]
+        """
+        try:
+            return self._extract_entries(data)
+        except TypeError:
+            path = source or self.options.path
+            sys.stderr.write(
+                f"An error happened while checking {path} file: incorrect format\n"
+            )
+            sys.exit(self.EXIT_CODE_ERROR)
+
+    @staticmethod
+    def _collect_entries(
+        documents: List[Any],
+        find: Callable[[Any], List[Entry]],
+    ) -> List[Entry]:
+        """
+        Find entries in all documents of YAML stream.
+
+        Entries of multi-document stream are marked with their document index.
+
+        :param documents: parsed documents
+        :type documents: List[Any]
+        :param find: function finding entries in a document
+        :type find: Callable[[Any], List[Entry]]
+        :return: list of ids and entries with number of lines they are attached to
+        :rtype: List[Entry]
+        """
+        result: List[Entry] = []
+        for index, document in enumerate(documents, 1):
+            if not document:
+                continue
+            entries = find(document)
+            if len(documents) > 1:
+                entries = [{**entry, "document": {"index": index}} for entry in entries]
+            result += entries
+
+        return result
+
+    def _is_archive(self) -> bool:
+        """
+        Check if requested file is an archive.
+
+        :return: whether configs should be read from archive members
+        :rtype: bool
+        """
+        return str(self.options.path).endswith(self.ARCHIVE_SUFFIXES)
+
+    def _is_archive_member(self, name: str) -> bool:
+        """
+        Check if archive member is a config.
+
+        :param name: member path inside archive
+        :type name: str
+        :return: whether member should be checked
+        :rtype: bool
+        """
+        return posixpath.basename(name) == self.ARCHIVE_MEMBER
+
+    def _read_zip_archive(self) -> Iterator[Tuple[str, bytes]]:
+        """
+        Read config members of requested zip archive through its central directory.
+
+        :yields: members names with their content
+        """
+        with zipfile.ZipFile(self.options.path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and self._is_archive_member(info.filename):
+                    yield info.filename, archive.read(info)
+
+    def _read_tar_archive(self) -> Iterator[Tuple[str, bytes]]:
+        """
+        Stream config members of requested tar archive.
+
+        :yields: members names with their content
+        """
+        with tarfile.open(self.options.path, mode="r|*") as stream:
+            for member in stream:
+                if member.isfile() and self._is_archive_member(member.name):
+                    content = cast(IO[bytes], stream.extractfile(member)).read()
+                    yield member.name, content
+
+    def _read_archive(self) -> Iterator[Tuple[str, bytes]]:
+        """
+        Stream config members of requested archive without extracting it.
+
+        :return: members names with their content
+        :rtype: Iterator[Tuple[str, bytes]]
+        """
+        if self.options.path.endswith(".zip"):
+            return self._read_zip_archive()
+
+        return self._read_tar_archive()
+
+    def _load_archive_members(self) -> List[Tuple[str, List[Any]]]:
+        """
+        Load all config members of requested archive.
+
+        :return: members locations with their parsed configs
+        :rtype: List[Tuple[str, List[Any]]]
+        """
+        result = []
+        for member, content in self._read_archive():
+            source = f"{self.options.path}!{member}"
+            try:
+                result.append((source, self._load_documents(content)))
+            except ScannerError:
+                sys.stderr.write(f"{source} is not a YAML file\n")
+                sys.exit(self.EXIT_CODE_ERROR)
+
+        return result
+
+    def _parse_archive(self) -> List[Tuple[str, List[Any]]]:
+        """
+        Parse all config members of requested archive.
+
+        :return: members locations with their parsed configs
+        :rtype: List[Tuple[str, List[Any]]]
+        """
+        try:
+            result = self._load_archive_members()
+        except FileNotFoundError:
+            sys.stderr.write(f"No file {self.options.path} found\n")
+            sys.exit(self.EXIT_CODE_FILE_NOT_FOUND)
+        except (tarfile.TarError, zipfile.BadZipFile):
+            sys.stderr.write(f"{self.options.path} is not an archive\n")
+            sys.exit(self.EXIT_CODE_ERROR)
+        if not result:
+            sys.stderr.write(f"No {self.ARCHIVE_MEMBER} found in {self.options.path}\n")
+            sys.exit(self.EXIT_CODE_FILE_NOT_FOUND)
+
+        return result
+
+    def _parse_sources(
+        self,
+    ) -> List[Tuple[Union[str, None], List[Any]]]:  # noqa: SIM907
+        """
+        Parse requested file or all config members of requested archive.
+
+        :return: archive members locations, None for a plain file, with parsed configs
+        :rtype: List[Tuple[Union[str, None], List[Any]]]
+        """
+        if self._is_archive():
+            return list(self._parse_archive())
+
+        return [(None, self._parse_documents())]
+
+    def _collect_source_entries(
+        self, source: Union[str, None], documents: List[Any]  # noqa: SIM907
+    ) -> List[Entry]:
+        """
+        Find entries in all documents of config marking them with its location.
+
+        :param source: archive member the config was read from
+        :type source: Union[str, None]
+        :param documents: parsed documents
+        :type documents: List[Any]
+        :return: list of ids and entries with number of lines they are attached to
+        :rtype: List[Entry]
+        """
+        entries = self._collect_entries(
+            documents, functools.partial(self._find_entries, source=source)
+        )
+        if source is not None:
+            for entry in entries:
+                entry["source"] = {"name": source}
+
+        return entries
+
+    def _list_entries(
+        self,
+    ) -> List[Entry]:  # noqa: SIM907
+        """
+        Parse requested file and find all entries in it.
+
+        Entries of archive members are marked with their location.
+
+        :return: list of ids and entries with number of lines they are attached to
+        :rtype: List[Entry]
+        """
+        with self.metrics.measure("parse"):
+            sources = self._parse_sources()
+        self.metrics.inc("configs_parsed", len(sources))
+        result: List[Entry] = []
+        with self.metrics.measure("extraction"):
+            for source, documents in sources:
+                result += self._collect_source_entries(source, documents)
+        self.metrics.inc("entries_found", len(result))
+
+        return result
+
+    def _create_output(self, entry: Entry, output: str) -> Tuple[str, int]:
+        """
+        Edit and write shellcheck output.
+
+        :param entry: entry data to insert into output
+        :type entry: Entry
+        :param output: base output to edit and process
+        :type output: str
+        :return: subprocess output with process exit code
+        :rtype: Tuple[str, int]
+        """
+        # regular expression for finding line number from output text:
+        # returns two groups: "line #" for output replacement and line number itself
+        regular = re.findall(
+            r"In (?:document \d+ )?entry \".*\" (?P<switch>line (?P<line>\d+))", output
+        )
+        if not regular:
+            return output, self.EXIT_CODE_SUCCESS
+        for line_number in regular:
+            # subtract 2 because of number of lines difference
+            # in temporary file and source file
+            entry_line = int(entry["entry"]["line"])
+            new_line_number = (entry_line + int(line_number[1])) - 2
+            location = f"on line {new_line_number}"
+            if "source" in entry:
+                location = f"at {entry['source']['name']}:{new_line_number}"
+
+            output = output.replace(line_number[0], location)
+
+        return output, self.EXIT_CODE_ERROR
+
+    @staticmethod
+    def _write_output(output: str, code: int) -> None:
+        """
+        Write whole tool output and exit with desired code.
+
+        :param output: output to write in console:
+        :type output: str
+        :param code: exit code for the tool
+        :type code: int
+        """
+        sys.stdout.write(output)
+        sys.exit(code)
+
+    def _write_diagnostics(self, message: str) -> None:
+        """
+        Write tool diagnostics message if requested.
+
+        :param message: message to write
+        :type message: str
+        """
+        if self.options.diagnostics:
+            sys.stderr.write(f"{message}\n")
+
+    def _spawn_entry_file(
+        self,
+        entry: Entry,
+        tmp: IO[str],
+    ) -> EntryProcess:
+        """
+        Start a shellcheck command on temporary file.
+
+        :param entry: entry data to insert into output
+        :type entry: Entry
+        :param tmp: created temporary file
+        :type tmp: IO[str]
+        :return: started process
+        :rtype: EntryProcess
+        """
+        try:
+            if self.options.launcher == "spawn":
+                return self.launcher.spawn([self.options.shellcheck, tmp.name])
+            return subprocess.Popen(  # nosec
+                args=[self.options.shellcheck, tmp.name],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            sys.stderr.write(f"No shellcheck found: '{self.options.shellcheck}'\n")
+            sys.exit(self.EXIT_CODE_FILE_NOT_FOUND)
+
+    def _wait_entry_file(
+        self,
+        entry: Entry,
+        process: EntryProcess,
+    ) -> Tuple[bytes, bytes]:
+        """
+        Wait for a shellcheck command to finish.
+
+        :param entry: entry data to insert into output
+        :type entry: Entry
+        :param process: started shellcheck process
+        :type process: EntryProcess
+        :return: process output
+        :rtype: Tuple[bytes, bytes]
+        """
+        return self._read_entry_output(entry, process.communicate)
+
+    def _read_entry_output(
+        self,
+        entry: Entry,
+        communicate: Callable[[], Tuple[bytes, bytes]],
+    ) -> Tuple[bytes, bytes]:
+        """
+        Get a shellcheck command output and exit if the command failed.
+
+        :param entry: entry data to insert into output
+        :type entry: Entry
+        :param communicate: callable waiting for the command output
+        :type communicate: Callable[[], Tuple[bytes, bytes]]
+        :return: process output
+        :rtype: Tuple[bytes, bytes]
+        """
+        try:
+            stdout, stderr = communicate()
+
+        except subprocess.TimeoutExpired as err:
+            sys.stderr.write(
+                f"Failed to check entrypoint {entry['id']['id']} on line {entry['entry']['line']}: {err.stderr}"  # noqa: E501
+            )
+            sys.exit(self.EXIT_CODE_ERROR)
+
+        if stderr:
+            sys.stderr.write(
+                f"Failed to check entrypoint {entry['id']['id']} on line {entry['entry']['line']}: {stderr.decode('UTF-8')}"  # noqa: E501
+            )
+            sys.exit(self.EXIT_CODE_ERROR)
+
+        return stdout, stderr
+
+    def _check_entry_file(
+        self,
+        entry: Entry,
+        tmp: IO[str],
+    ) -> Tuple[bytes, bytes]:
+        """
+        Run a shellcheck command on temporary file.
+
+        :param entry: entry data to insert into output
+        :type entry: Entry
+        :param tmp: created temporary file
+        :type tmp: IO[str]
+        :return: process output
+        :rtype: Tuple[bytes, bytes]
+        """
+        process = self._spawn_entry_file(entry, tmp)
+
+        return self._wait_entry_file(entry, process)
+
+    @staticmethod
+    def _create_entry_file(entry: Entry) -> IO[str]:
+        """
+        Write entry to temporary file.
+
+        :param entry: entry data to write
+        :type entry: Entry
+        :return: created temporary file
+        :rtype: IO[str]
+        """
+        tmp = tempfile.NamedTemporaryFile("w+")
+        tmp.write("#!/bin/sh\n")
+        tmp.write(str(entry["entry"]["entry"]))
+        tmp.flush()
+
+        return tmp
+
+    def _create_entry_output(
+        self, entry: Entry, tmp: IO[str], stdout: bytes
+    ) -> Tuple[str, int]:
+        """
+        Create entry output from shellcheck output for its temporary file.
+
+        :param entry: entry data to insert into output
+        :type entry: Entry
+        :param tmp: checked temporary file
+        :type tmp: IO[str]
+        :param stdout: shellcheck output
+        :type stdout: bytes
+        :return: entry output with exit code
+        :rtype: Tuple[str, int]
+        """
+        name = f"entry \"{entry['id']['id']}\""
+        if "document" in entry:
+            name = f"document {entry['document']['index']} {name}"
+        output = stdout.decode("utf-8").replace(tmp.name, name)
+
+        return self._create_output(entry=entry, output=output)
+
+    @classmethod
+    def _is_plain_word(cls, word: str) -> bool:
+        """
+        Check if command word is not a keyword, builtin or command with checks.
+
+        :param word: word to check
+        :type word: str
+        :return: whether word is plain
+        :rtype: bool
+        """
+        if os.path.basename(word).lower() in cls.PREFILTER_WORDS:
+            return False
+        # "=" is only safe in options like "--config=setup.cfg"
+        return "=" not in word or word.startswith("-")
+
+    @classmethod
+    def _is_plain_command(cls, words: List[str]) -> bool:
+        """
+        Check if command consists of plain words ShellCheck has no checks for.
+
+        :param words: command name and arguments
+        :type words: List[str]
+        :return: whether command is plain
+        :rtype: bool
+        """
+        if not words:
+            return True
+        command = words[0]
+        # flags, paths ending with slash, names ending with dot or comma
+        # and assignments used as commands
+        if command.startswith("-") or command.endswith(("/", ".", ",")):
+            return False
+
+        return "=" not in command and all(map(cls._is_plain_word, words))
+
+    @classmethod
+    def _is_trivially_clean(cls, entry: Entry) -> bool:
+        """
+        Check if entry is a plain command ShellCheck has nothing to report about.
+
+        The check is conservative: entry must consist of simple commands
+        with plain words only and must not use any keyword, builtin
+        or command ShellCheck has special checks for.
+
+        :param entry: entry data to check
+        :type entry: Entry
+        :return: whether entry could be skipped
+        :rtype: bool
+        """
+        text = str(entry["entry"]["entry"])
+        if not cls.PREFILTER_CHARACTERS.fullmatch(text):
+            return False
+
+        return all(
+            cls._is_plain_command(shlex.split(line)) for line in text.splitlines()
+        )
+
+    @staticmethod
+    def _get_entry_hash(entry: Entry) -> str:
+        """
+        Get hash of the entry body.
+
+        :param entry: entry data to hash
+        :type entry: Entry
+        :return: entry body hash
+        :rtype: str
+        """
+        body = str(entry["entry"]["entry"]).encode("utf-8")
+
+        return hashlib.sha256(body).hexdigest()
+
+    def _load_durations(self) -> Dict[str, List[float]]:
+        """
+        Load shellcheck durations recorded for entries bodies in previous runs.
+
+        :return: shellcheck durations and sizes by entries bodies hashes
+        :rtype: Dict[str, List[float]]
+        """
+        if not self.options.cache_dir:
+            return {}
+        try:
+            path = os.path.join(self.options.cache_dir, self.DURATIONS_FILE)
+            with open(path) as stream:
+                records = dict(json.load(stream))
+        except (OSError, ValueError, TypeError):
+            return {}
+
+        # records of unexpected shape are treated as not recorded
+        return {
+            key: record
+            for key, record in records.items()
+            if self._is_duration_record(record)
+        }
+
+    @staticmethod
+    def _is_duration_record(record: Any) -> bool:
+        """
+        Check if the loaded record holds a shellcheck duration and an entry size.
+
+        :param record: loaded record
+        :type record: Any
+        :return: whether record is a list of two non-negative finite numbers
+        :rtype: bool
+        """
+        if not isinstance(record, list) or len(record) != 2:
+            return False
+
+        return all(
+            type(value) in (int, float) and math.isfinite(value) and value >= 0
+            for value in record
+        )
+
+    def _store_durations(self, durations: Dict[str, List[float]]) -> None:
+        """
+        Record shellcheck durations for entries bodies.
+
+        :param durations: shellcheck durations and sizes by entries bodies hashes
+        :type durations: Dict[str, List[float]]
+        """
+        if not self.options.cache_dir:
+            return
+        # the most recently checked entries are the last ones
+        records = list(durations.items())[-self.DURATIONS_LIMIT :]  # noqa: E203
+        try:
+            self._write_atomically(
+                os.path.join(self.options.cache_dir, self.DURATIONS_FILE),
+                json.dumps(dict(records)),
+            )
+        except OSError as err:
+            sys.stderr.write(f"Failed to write cache: {err}\n")
+
+    def _get_expected_costs(
+        self,
+        entries: List[Entry],
+        durations: Dict[str, List[float]],
+    ) -> Tuple[List[float], bool]:
+        """
+        Estimate shellcheck duration of every entry.
+
+        Recorded duration is used if entry body was checked before, otherwise
+        it is estimated from the entry size.
+
+        :param entries: entries to estimate
+        :type entries: List[Entry]
+        :param durations: shellcheck durations and sizes by entries bodies hashes
+        :type durations: Dict[str, List[float]]
+        :return: expected costs and whether they are in seconds
+        :rtype: Tuple[List[float], bool]
+        """
+        total_duration = sum(duration for duration, _ in durations.values())
+        total_size = sum(size for _, size in durations.values())
+        # seconds per byte, entries sizes are compared if nothing recorded
+        rate = total_duration / total_size if total_size else 1.0
+        costs = []
+        for entry in entries:
+            record = durations.get(self._get_entry_hash(entry))
+            size = len(str(entry["entry"]["entry"]))
+            costs.append(record[0] if record else size * rate)
+
+        return costs, bool(total_size)
+
+    @staticmethod
+    def _predict_makespan(costs: List[float], jobs: int) -> float:
+        """
+        Predict time to check entries in the given order with the given concurrency.
+
+        :param costs: expected costs of entries in the start order
+        :type costs: List[float]
+        :param jobs: number of concurrently running processes
+        :type jobs: int
+        :return: predicted makespan
+        :rtype: float
+        """
+        workers = [0.0] * max(1, jobs)
+        for cost in costs:
+            heapq.heapreplace(workers, workers[0] + cost)
+
+        return max(workers)
+
+    def _select_entries(
+        self,
+        entries: List[Entry],
+        results: List[Union[Tuple[str, int], None]],  # noqa: SIM907
+    ) -> Dict[int, List[int]]:
+        """
+        Select entries to shellcheck, skipping trivially clean and repeated ones.
+
+        :param entries: entries to check
+        :type entries: List[Entry]
+        :param results: entries outputs with exit codes, filled for skipped entries
+        :type results: List[Union[Tuple[str, int], None]]
+        :return: entries to shellcheck with later entries having the same body
+        :rtype: Dict[int, List[int]]
+        """
+        groups: Dict[str, List[int]] = {}
+        for index, entry in enumerate(entries):
+            if self.options.prefilter and self._is_trivially_clean(entry):
+                results[index] = "", self.EXIT_CODE_SUCCESS
+                self.metrics.inc("entries_prefiltered")
+            else:
+                groups.setdefault(str(entry["entry"]["entry"]), []).append(index)
+        self.metrics.inc(
+            "entries_deduplicated", sum(len(group) - 1 for group in groups.values())
+        )
+
+        return {group[0]: group[1:] for group in groups.values()}
+
+    def _start_entry(self, entry: Entry) -> StartedEntry:
+        """
+        Start a shellcheck command on temporary file with the entry.
+
+        :param entry: entry data to check
+        :type entry: Entry
+        :return: temporary file, started process and its start time
+        :rtype: StartedEntry
+        """
+        tmp = self._create_entry_file(entry)
+        with ExitStack() as stack:
+            # temporary file is removed if the process could not be started
+            stack.callback(tmp.close)
+            with self.metrics.measure("spawn"):
+                process = self._spawn_entry_file(entry, tmp)
+            stack.pop_all()
+        self.metrics.inc("shellcheck_spawns")
+
+        return tmp, process, time.monotonic()
+
+    @staticmethod
+    def _communicate_entry_file(
+        process: "subprocess.Popen[bytes]",
+    ) -> Tuple[Tuple[bytes, bytes], float]:
+        """
+        Wait for a shellcheck command output, called in a separate thread.
+
+        :param process: started shellcheck process
+        :type process: subprocess.Popen[bytes]
+        :return: process output with the time process finished
+        :rtype: Tuple[Tuple[bytes, bytes], float]
+        """
+        output = process.communicate()
+
+        return output, time.monotonic()
+
+    def _wait_any_entry(
+        self,
+        entries: List[Entry],
+        running: RunningEntries,
+        futures: EntriesOutputs,
+    ) -> Tuple[int, bytes, float]:
+        """
+        Wait for whichever running shellcheck command finishes first.
+
+        :param entries: checked entries
+        :type entries: List[Entry]
+        :param running: temporary files, processes and start times by entries
+        :type running: RunningEntries
+        :param futures: threads waiting for popen processes outputs by entries
+        :type futures: EntriesOutputs
+        :return: finished entry index, its shellcheck output and finish time
+        :rtype: Tuple[int, bytes, float]
+        """
+        if self.options.launcher == "spawn":
+            processes = {
+                cast(SpawnedProcess, process): index
+                for index, (_, process, _) in running.items()
+            }
+            process = self.launcher.wait_any(list(processes))
+            index = processes[process]
+            stdout, _ = self._wait_entry_file(entries[index], process)
+
+            return index, stdout, cast(float, process.finished)
+
+        done, _ = concurrent.futures.wait(
+            [futures[index] for index in running],
+            return_when=concurrent.futures.FIRST_COMPLETED,
+        )
+        index = next(index for index in running if futures[index] in done)
+        future = futures.pop(index)
+        stdout, _ = self._read_entry_output(entries[index], lambda: future.result()[0])
+
+        return index, stdout, future.result()[1]
+
+    @staticmethod
+    def _cancel_entries(
+        first: int,
+        pending: Deque[int],
+        running: RunningEntries,
+        futures: EntriesOutputs,
+    ) -> None:
+        """
+        Kill running and drop pending entries placed after the given one.
+
+        :param first: index of the last entry to keep
+        :type first: int
+        :param pending: entries not started yet
+        :type pending: Deque[int]
+        :param running: temporary files, processes and start times by entries
+        :type running: RunningEntries
+        :param futures: threads waiting for popen processes outputs by entries
+        :type futures: EntriesOutputs
+        """
+        for index in [index for index in running if index > first]:
+            tmp, process, _ = running.pop(index)
+            futures.pop(index, None)
+            process.kill()
+            process.wait()
+            tmp.close()
+        kept = [index for index in pending if index <= first]
+        pending.clear()
+        pending.extend(kept)
+
+    def _run_entries(  # noqa: CCR001
+        self, entries: List[Entry]
+    ) -> List[Union[Tuple[str, int], None]]:  # noqa: SIM907
+        """
+        Shellcheck entries concurrently.
+
+        Entries with the same body are checked once, the most expensive
+        entries are started first and a free slot is refilled as soon as any
+        process finishes. With fail fast mode entries after the first failing
+        one are killed or not started at all, so the result is the same
+        as of checking entries one by one.
+
+        :param entries: entries to check
+        :type entries: List[Entry]
+        :return: entries outputs with exit codes, None for not checked entries
+        :rtype: List[Union[Tuple[str, int], None]]
+        """
+        results: List[Union[Tuple[str, int], None]]  # noqa: SIM907
+        results = [None] * len(entries)
+        concurrency = AdaptiveConcurrency(
+            max_jobs=self.options.max_jobs, log=self._write_diagnostics
+        )
+        duplicates = self._select_entries(entries, results)
+        durations = self._load_durations()
+        costs, in_seconds = self._get_expected_costs(entries, durations)
+        pending = deque(sorted(duplicates, key=costs.__getitem__, reverse=True))
+        predicted = self._predict_makespan(
+            [costs[index] for index in pending], concurrency.limit
+        )
+        running: RunningEntries = {}
+        futures: EntriesOutputs = {}
+        # entries after the first failing one are not checked in fail fast mode
+        failed = len(entries)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency.limit)
+        started_run = time.monotonic()
+        try:
+            while pending or running:
+                while pending and len(running) < concurrency.target:
+                    index = pending.popleft()
+                    running[index] = self._start_entry(entries[index])
+                    if self.options.launcher != "spawn":
+                        futures[index] = executor.submit(
+                            self._communicate_entry_file,
+                            cast("subprocess.Popen[bytes]", running[index][1]),
+                        )
+                with self.metrics.measure("wait"):
+                    index, stdout, finished = self._wait_any_entry(
+                        entries, running, futures
+                    )
+                tmp, _, started = running.pop(index)
+                concurrency.update(finished - started, costs[index])
+                # the most recently checked entries are kept the last ones
+                key = self._get_entry_hash(entries[index])
+                durations.pop(key, None)
+                size = len(str(entries[index]["entry"]["entry"]))
+                durations[key] = [finished - started, size]
+                with self.metrics.measure("render"):
+                    for other in [index, *duplicates[index]]:
+                        results[other] = self._create_entry_output(
+                            entries[other], tmp, stdout
+                        )
+                tmp.close()
+                self.metrics.inc("entries_checked")
+                code = cast(Tuple[str, int], results[index])[1]
+                if self.options.fail_fast and code != self.EXIT_CODE_SUCCESS:
+                    failed = min(failed, index)
+                    self._cancel_entries(failed, pending, running, futures)
+        finally:
+            self._cancel_entries(-1, pending, running, futures)
+            executor.shutdown()
+
+        prediction = (
+            f"{predicted:.3f}s" if in_seconds else "unknown (no recorded durations)"
+        )
+        actual = time.monotonic() - started_run
+        jobs = f"{len(duplicates)} entries on {concurrency.limit} jobs"
+        makespans = f"predicted makespan {prediction}, actual makespan {actual:.3f}s"
+        self._write_diagnostics(f"timing: {jobs}, {makespans}")
+        self._store_durations(durations)
+        self.metrics.inc("entries_skipped", max(0, len(entries) - failed - 1))
+
+        return [
+            result if index <= failed else None for index, result in enumerate(results)
+        ]
+
+    def _combine_results(
+        self, results: List[Union[Tuple[str, int], None]]  # noqa: SIM907
+    ) -> Tuple[str, int]:
+        """
+        Combine entries outputs into the tool output.
+
+        :param results: entries outputs with exit codes, None for not checked entries
+        :type results: List[Union[Tuple[str, int], None]]
+        :return: tool output with exit code
+        :rtype: Tuple[str, int]
+        """
+        result = ""
+        exit_ = self.EXIT_CODE_SUCCESS
+        for checked in results:
+            if checked is None:
+                continue
+            output, code = checked
+            result += output
+            if code != self.EXIT_CODE_SUCCESS:
+                exit_ = code
+
+        return result, exit_
+
+    def _in_shard(self, entry: Entry) -> bool:
+        """
+        Check if entry belongs to the requested shard.
+
+        :param entry: entry data to check
+        :type entry: Entry
+        :return: whether entry should be checked by this run
+        :rtype: bool
+        """
+        if self.options.shard is None:
+            return True
+        index, count = self.options.shard
+        path = entry["source"]["name"] if "source" in entry else self.options.path
+        key = f"{path}\0{entry['id']['id']}\0{entry['entry']['line']}"
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+        return int(digest[:16], 16) % count == index
+
+    def _create_partial_result(
+        self,
+        results: List[Tuple[int, Union[Tuple[str, int], None]]],  # noqa: SIM907
+        total: int,
+    ) -> str:
+        """
+        Create partial result of the sharded run.
+
+        :param results: entries positions with their outputs and exit codes
+        :type results: List[Tuple[int, Union[Tuple[str, int], None]]]
+        :param total: number of entries in the config
+        :type total: int
+        :return: partial result to merge
+        :rtype: str
+        """
+        return json.dumps(
+            {
+                "version": self.PARTIAL_RESULT_VERSION,
+                "shard": list(self.options.shard),
+                "path": self.options.path,
+                "entries": total,
+                "fail_fast": self.options.fail_fast,
+                "results": [
+                    {"order": order, "output": checked[0], "code": checked[1]}
+                    for order, checked in results
+                    if checked is not None
+                ],
+            }
+        )
+
+    def _check_entries(self) -> None:
+        """Check the created file for possible entrypoints issues."""
+        entries = self._list_entries()
+        orders = [order for order, entry in enumerate(entries) if self._in_shard(entry)]
+        results = self._run_entries([entries[order] for order in orders])
+        if self.options.shard is not None:
+            result = self._create_partial_result(
+                results=list(zip(orders, results)), total=len(entries)
+            )
+            exit_ = self.EXIT_CODE_SUCCESS
+        else:
+            result, exit_ = self._combine_results(results)
+
+        self._store_cached_result(output=result, code=exit_)
+        self._write_output(output=result, code=exit_)
+
+    def _read_partials(self) -> List[Dict[str, Any]]:
+        """
+        Read partial results of the sharded runs.
+
+        :return: partial results
+        :rtype: List[Dict[str, Any]]
+        """
+        partials = []
+        for path in self.options.partials:
+            try:
+                with open(path) as stream:
+                    partials.append(json.load(stream))
+            except FileNotFoundError:
+                sys.stderr.write(f"No file {path} found\n")
+                sys.exit(self.EXIT_CODE_FILE_NOT_FOUND)
+            except ValueError:
+                sys.stderr.write(f"{path} is not a partial result\n")
+                sys.exit(self.EXIT_CODE_ERROR)
+
+        return partials
+
+    def _verify_partials(self, partials: List[Dict[str, Any]]) -> None:
+        """
+        Verify partial results are made by every shard of the same run.
+
+        :param partials: partial results
+        :type partials: List[Dict[str, Any]]
+        :raises ValueError: if partial results are from different runs
+            or some shards are missing or duplicated
+        """
+        versions = {partial["version"] for partial in partials}
+        runs = {
+            (
+                partial["shard"][1],
+                partial["path"],
+                partial["entries"],
+                bool(partial["fail_fast"]),
+            )
+            for partial in partials
+        }
+        shards = sorted(partial["shard"][0] for partial in partials)
+        if versions != {self.PARTIAL_RESULT_VERSION} or len(runs) != 1:
+            raise ValueError("partial results are from different runs")
+        if shards != list(range(runs.pop()[0])):
+            raise ValueError("some shards are missing or duplicated")
+
+    def _collect_partial_results(
+        self, partials: List[Dict[str, Any]]
+    ) -> List[Union[Tuple[str, int], None]]:  # noqa: SIM907
+        """
+        Collect entries outputs from partial results of every shard.
+
+        :param partials: partial results
+        :type partials: List[Dict[str, Any]]
+        :return: entries outputs with exit codes, None for not checked entries
+        :rtype: List[Union[Tuple[str, int], None]]
+        """
+        self._verify_partials(partials)
+        results: List[Union[Tuple[str, int], None]]  # noqa: SIM907
+        results = [None] * partials[0]["entries"]
+        for partial in partials:
+            for checked in partial["results"]:
+                results[checked["order"]] = checked["output"], checked["code"]
+
+        return results
+
+    def _stop_at_first_failure(
+        self, results: List[Union[Tuple[str, int], None]]  # noqa: SIM907
+    ) -> List[Union[Tuple[str, int], None]]:  # noqa: SIM907
+        """
+        Drop entries outputs after the first failing entry.
+
+        Every shard stops at its first failure, so the single run
+        would stop at the earliest one.
+
+        :param results: entries outputs with exit codes, None for not checked entries
+        :type results: List[Union[Tuple[str, int], None]]
+        :return: entries outputs up to the first failing entry
+        :rtype: List[Union[Tuple[str, int], None]]
+        """
+        failures = [
+            order
+            for order, checked in enumerate(results)
+            if checked and checked[1] != self.EXIT_CODE_SUCCESS
+        ]
+
+        return results[: min(failures, default=len(results)) + 1]
+
+    def _merge_results(self) -> None:
+        """Merge partial results of the sharded runs into the tool output."""
+        partials = self._read_partials()
+        try:
+            results = self._collect_partial_results(partials)
+        except (KeyError, TypeError, IndexError, ValueError) as err:
+            sys.stderr.write(f"Failed to merge partial results: {err}\n")
+            sys.exit(self.EXIT_CODE_ERROR)
+
+        if any(partial["fail_fast"] for partial in partials):
+            results = self._stop_at_first_failure(results)
+
+        self._write_output(*self._combine_results(results))
+
+    def _get_shellcheck_identity(self) -> Union[str, None]:  # noqa: SIM907
+        """
+        Identify the shellcheck executable by its resolved path, size and mtime.
+
+        :return: shellcheck identity or None if shellcheck not found
+        :rtype: Union[str, None]
+        """
+        path = shutil.which(self.options.shellcheck)
+        if path is None:
+            return None
+        path = os.path.realpath(path)
+        stat = os.stat(path)
+
+        return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    @staticmethod
+    def _get_shellcheckrc_paths() -> List[str]:
+        """
+        List rc files ShellCheck could read for the checked temporary files.
+
+        ShellCheck looks for rc files in the checked file directory and its
+        parents first, then falls back to the user ones.
+
+        :return: rc files paths
+        :rtype: List[str]
+        """
+        directory = os.path.realpath(tempfile.gettempdir())
+        directories = [directory]
+        while os.path.dirname(directory) != directory:
+            directory = os.path.dirname(directory)
+            directories.append(directory)
+        config_home = os.path.expanduser(
+            os.environ.get("XDG_CONFIG_HOME") or "~/.config"
+        )
+
+        return [
+            *(
+                os.path.join(directory, name)
+                for directory in directories
+                for name in (".shellcheckrc", "shellcheckrc")
+            ),
+            os.path.join(config_home, "shellcheckrc"),
+            os.path.expanduser("~/.shellcheckrc"),
+        ]
+
+    def _get_shellcheck_settings(self) -> Dict[str, Any]:
+        """
+        Get ShellCheck settings coming from the environment and rc files.
+
+        :return: SHELLCHECK_OPTS value and rc files contents hashes by paths
+        :rtype: Dict[str, Any]
+        """
+        rc_files: Dict[str, str] = {}
+        for path in self._get_shellcheckrc_paths():
+            with suppress(OSError), open(path, "rb") as stream:
+                rc_files[path] = hashlib.sha256(stream.read()).hexdigest()
+
+        return {"opts": os.environ.get("SHELLCHECK_OPTS"), "rc_files": rc_files}
+
+    def _get_cache_options(self) -> Dict[str, Any]:
+        """
+        Get options which affect the tool output.
+
+        :return: options to be a part of the cache key
+        :rtype: Dict[str, Any]
+        """
+        options = dict(sorted(vars(self.options).items()))
+        for key in self.CACHE_IGNORED_OPTIONS:
+            options.pop(key, None)
+
+        # compared with the stored record, so tuples are turned into lists
+        return cast(Dict[str, Any], json.loads(json.dumps(options)))
+
+    def _get_cache_file(self) -> str:
+        """
+        Get path of the cache file for the checked config.
+
+        :return: cache file path
+        :rtype: str
+        """
+        path = os.path.abspath(self.options.path)
+        key = hashlib.sha256(path.encode("utf-8")).hexdigest()
+
+        return os.path.join(self.options.cache_dir, f"{key}.json")
+
+    @staticmethod
+    def _write_atomically(path: str, content: str) -> None:
+        """
+        Write the file so readers never see it partially written.
+
+        :param path: path of the file to write
+        :type path: str
+        :param content: content to write
+        :type content: str
+        """
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        descriptor, tmp = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        try:
+            # temporary files are private, but written files must stay readable
+            os.fchmod(descriptor, 0o644)
+            with os.fdopen(descriptor, "w") as stream:
+                stream.write(content)
+            os.replace(tmp, path)
+        finally:
+            # temporary file is left only if writing failed
+            with suppress(FileNotFoundError):
+                os.unlink(tmp)
+
+    def _read_cache_record(self) -> Union[Dict[str, Any], None]:  # noqa: SIM907
+        """
+        Read the previous run record made with the same tool, shellcheck and options.
+
+        ShellCheck settings from SHELLCHECK_OPTS and rc files must be the same too.
+
+        :return: cache record or None if there is no suitable one
+        :rtype: Union[Dict[str, Any], None]
+        """
+        try:
+            with open(self._get_cache_file()) as stream:
+                record: Dict[str, Any] = json.load(stream)
+        except (OSError, ValueError):
+            return None
+        expected = {
+            "version": __version__,
+            "shellcheck": self._get_shellcheck_identity(),
+            "shellcheck_settings": self._get_shellcheck_settings(),
+            "options": self._get_cache_options(),
+        }
+        if any(record.get(key) != value for key, value in expected.items()):
+            return None
+
+        return record
+
+    def _refresh_cached_stat(
+        self, record: Dict[str, Any], stat: os.stat_result
+    ) -> None:
+        """
+        Remember new config stat to skip hashing the same content next time.
+
+        :param record: cache record
+        :type record: Dict[str, Any]
+        :param stat: config stat
+        :type stat: os.stat_result
+        """
+        record.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        with suppress(OSError):
+            self._write_atomically(self._get_cache_file(), json.dumps(record))
+
+    def _is_config_unchanged(self, record: Dict[str, Any]) -> bool:
+        """
+        Check if config is the same as in the previous run.
+
+        Freshness is validated with config size and mtime first, falling back
+        to the config content hash.
+
+        :param record: cache record
+        :type record: Dict[str, Any]
+        :return: whether config is unchanged
+        :rtype: bool
+        """
+        try:
+            stat = os.stat(self.options.path)
+            if (record.get("size"), record.get("mtime_ns")) == (
+                stat.st_size,
+                stat.st_mtime_ns,
+            ):
+                return True
+            with open(self.options.path, "rb") as stream:
+                digest = hashlib.sha256(stream.read()).hexdigest()
+        except OSError:
+            return False
+        if record.get("sha256") == digest:
+            self._refresh_cached_stat(record, stat)
+
+        return record.get("sha256") == digest
+
+    def _load_cached_result(self) -> Union[Tuple[str, int], None]:  # noqa: SIM907
+        """
+        Get the result of the previous run if config and shellcheck are unchanged.
+
+        :return: previous output with exit code or None on cache miss
+        :rtype: Union[Tuple[str, int], None]
+        """
+        if not self.options.cache_dir:
+            return None
+        record = self._read_cache_record()
+        if record is None or not self._is_config_unchanged(record):
+            return None
+
+        return record["output"], record["code"]
+
+    def _store_cached_result(self, output: str, code: int) -> None:
+        """
+        Remember the tool result for the checked config.
+
+        :param output: tool output
+        :type output: str
+        :param code: tool exit code
+        :type code: int
+        """
+        if not self.options.cache_dir or not self._source:
+            return
+        identity = self._get_shellcheck_identity()
+        if identity is None:
+            return
+        record = dict(
+            self._source,
+            version=__version__,
+            shellcheck=identity,
+            shellcheck_settings=self._get_shellcheck_settings(),
+            options=self._get_cache_options(),
+            output=output,
+            code=code,
+        )
+        try:
+            self._write_atomically(self._get_cache_file(), json.dumps(record))
+        except OSError as err:
+            sys.stderr.write(f"Failed to write cache: {err}\n")
+
+    def _list_revisions(self) -> List[str]:
+        """
+        List git revisions in the requested range changing the config.
+
+        :return: revisions from the oldest to the newest
+        :rtype: List[str]
+        """
+        try:
+            output = subprocess.run(  # nosec
+                args=[
+                    "git",
+                    "rev-list",
+                    "--reverse",
+                    self.options.history,
+                    "--",
+                    self.options.path,
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=True,
+            ).stdout
+        except FileNotFoundError:
+            sys.stderr.write("No git found\n")
+            sys.exit(self.EXIT_CODE_FILE_NOT_FOUND)
+        except subprocess.CalledProcessError as err:
+            sys.stderr.write(
+                f"Failed to list revisions {self.options.history}: {err.stderr.decode('UTF-8')}"  # noqa: E501
+            )
+            sys.exit(self.EXIT_CODE_ERROR)
+
+        return output.decode("utf-8").split()
+
+    def _read_revisions(
+        self, revisions: List[str]
+    ) -> Iterator[Tuple[str, Union[str, None], bytes]]:  # noqa: SIM907
+        """
+        Read config content in every revision with a single git process.
+
+        :param revisions: revisions to read config in
+        :type revisions: List[str]
+        :yields: revision with config blob id (None if config is missing) and content
+        """
+        path = os.path.relpath(self.options.path)
+        if not path.startswith(".."):
+            path = f"./{path}"
+        process = subprocess.Popen(  # nosec
+            args=["git", "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        stdin, stdout = cast(IO[bytes], process.stdin), cast(IO[bytes], process.stdout)
+        try:
+            for revision in revisions:
+                stdin.write(f"{revision}:{path}\n".encode("utf-8"))
+                stdin.flush()
+                header = stdout.readline().split()
+                if len(header) != 3:
+                    yield revision, None, b""
+                    continue
+                oid, _, size = header
+                content = stdout.read(int(size))
+                stdout.read(1)
+                yield revision, oid.decode("utf-8"), content
+        finally:
+            stdin.close()
+            process.wait()
+
+    def _load_revision_entries(self, revision: str, content: bytes) -> List[Entry]:
+        """
+        Find all entries in config of the revision.
+
+        :param revision: revision config belongs to
+        :type revision: str
+        :param content: config content
+        :type content: bytes
+        :return: list of ids and entries with number of lines they are attached to
+        :rtype: List[Entry]
+        """
+        try:
+            return self._collect_entries(
+                self._load_documents(content), self._extract_entries
+            )
+        except (yaml.YAMLError, TypeError, AttributeError):
+            self._write_diagnostics(f"history: skipped malformed config in {revision}")
+
+            return []
+
+    def _audit_history(self) -> None:  # noqa: CCR001
+        """Report revisions where entries issues appeared or disappeared."""
+        states: List[Tuple[str, Union[str, None]]] = []  # noqa: SIM907
+        blobs: Dict[str, List[Entry]] = {}
+        for revision, oid, content in self._read_revisions(self._list_revisions()):
+            states.append((revision, oid))
+            if oid is not None and oid not in blobs:
+                blobs[oid] = self._load_revision_entries(revision, content)
+
+        # distinct entries bodies are checked only once across all revisions
+        entries = [entry for blob in blobs.values() for entry in blob]
+        results = iter(self._run_entries(entries))
+        issues: Dict[Union[str, None], Dict[str, List[str]]]  # noqa: SIM907
+        issues = {None: {}}
+        for oid, blob in blobs.items():
+            issues[oid] = {}
+            for entry, checked in zip(blob, results):
+                codes = set(re.findall(r"SC\d+", checked[0] if checked else ""))
+                hook = str(entry["id"]["id"])
+                issues[oid][hook] = sorted(codes.union(issues[oid].get(hook, [])))
+
+        report: Dict[str, str] = {}
+        exit_ = self.EXIT_CODE_SUCCESS
+        previous: Dict[str, List[str]] = {}
+        for revision, oid in states:
+            current = issues[oid]
+            for hook in dict.fromkeys([*previous, *current]):
+                before, after = previous.get(hook, []), current.get(hook, [])
+                appeared = [code for code in after if code not in before]
+                disappeared = [code for code in before if code not in after]
+                if appeared:
+                    report.setdefault(hook, f'Hook "{hook}":\n')
+                    report[hook] += f"  {revision} appeared: {', '.join(appeared)}\n"
+                    exit_ = self.EXIT_CODE_ERROR
+                if disappeared:
+                    report.setdefault(hook, f'Hook "{hook}":\n')
+                    report[
+                        hook
+                    ] += f"  {revision} disappeared: {', '.join(disappeared)}\n"
+            previous = current
+
+        self._write_output(output="".join(report.values()), code=exit_)
+
+    def _write_metrics(self) -> None:
+        """Write collected metrics to the requested file."""
+        if not self.options.metrics_file:
+            return
+        try:
+            self._write_atomically(self.options.metrics_file, self.metrics.render())
+        except OSError as err:
+            sys.stderr.write(f"Failed to write metrics: {err}\n")
+
+    def _serve_language_server(self) -> None:
+        """Serve language server protocol on stdio and exit."""
+        server = LanguageServer(
+            shellcheck=self.options.shellcheck,
+            concurrency=AdaptiveConcurrency(
+                max_jobs=self.options.max_jobs, log=self._write_diagnostics
+            ),
+            reader=sys.stdin.buffer,
+            writer=sys.stdout.buffer,
+        )
+        sys.exit(self.EXIT_CODE_SUCCESS if server.serve() else self.EXIT_CODE_ERROR)
+
+    def _run_mode(self) -> None:
+        """Run the requested mode other than checking, each of them exits."""
+        if self.options.command == "merge":
+            self._merge_results()
+        if self.options.lsp:
+            self._serve_language_server()
+        if self.options.history:
+            self._audit_history()
+
+    def _replay_cached_result(self) -> None:
+        """Write previous result and exit if it can be replayed."""
+        cached = self._load_cached_result()
+        if self.options.cache_dir:
+            self.metrics.inc("cache_misses" if cached is None else "cache_hits")
+        if cached is not None:
+            self._write_output(*cached)
+
+    def check(self) -> None:
+        """Check file for entrypoints and verify them."""
+        try:
+            self._run_mode()
+            self._replay_cached_result()
+            self._check_entries()
+        finally:
+            self._write_metrics()
 
 
 def main() -> None:
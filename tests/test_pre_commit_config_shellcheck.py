@@ -1,12 +1,80 @@
-from argparse import Namespace
-from typing import Any, Dict, List
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import tarfile
+import zipfile
+from pathlib import Path
+import subprocess  # nosec
 from subprocess import TimeoutExpired
+from typing import Any, Dict, List, cast
+from argparse import Namespace, ArgumentTypeError
 
 import pytest
 from pytest_mock import MockerFixture
 from _pytest.capture import CaptureFixture
 
-from pre_commit_config_shellcheck import PreCommitConfigShellcheck
+from pre_commit_config_shellcheck import (
+    Metrics,
+    LanguageServer,
+    SpawnedProcess,
+    ProcessLauncher,
+    AdaptiveConcurrency,
+    PreCommitConfigShellcheck,
+)
+
+
+PREFILTER_CORPUS: List[str] = [
+    "python -m flake8",
+    "mypy --strict",
+    "pylint --rcfile=setup.cfg",
+    "seed-isort-config\nsleep infinity\n",
+    "pre_commit_config_shellcheck.py .pre-commit-config.yaml",
+    "foo --bar=baz,qux @x +y",
+    "/usr/bin/python3 -m pytest tests/",
+    "",
+    "removestar -i ${NAME}",  # noqa: FS003
+    "tr a-z A-Z",
+    "find -name foo",
+    "cp foo",
+    "If foo",
+    "chmod -r foo",
+    "xargs -i foo",
+    "-foo bar",
+    "foo/",
+    "FOO=bar",
+    "exit 300",
+    "a =b",
+    "egrep foo",
+    "cd foo\nls",
+    "echo foo   bar",
+    "printf %s",
+    "ls *.py",
+    "bash -c 'black .'",
+    "cat foo | grep bar",
+    "foo `bar`",
+    "mkdir foo && cd foo",
+    "ln -s foo",
+    "elseif foo",
+    "read foo",
+    "mypy.",
+    "a,",
+    "..",
+    "mypy. --strict",
+]
+# ShellCheck delaying entries marked with a "# slow" comment
+SLOW_SHELLCHECK: str = """#!{python}
+import os
+import sys
+import time
+
+with open(sys.argv[1]) as stream:
+    if "# slow" in stream.read():
+        time.sleep(0.5)
+os.execvp("shellcheck", ["shellcheck", *sys.argv[1:]])
+"""
 
 
 __all__: List[str] = [
@@ -21,14 +89,70 @@ __all__: List[str] = [
     "test_pre_commit_config_shellcheck___check_entries__timeout",
     "test_pre_commit_config_shellcheck___find_entries__empty",
     "test_pre_commit_config_shellcheck___find_entries__string",
-    "test_pre_commit_config_shellcheck___parse_file",
-    "test_pre_commit_config_shellcheck___parse_file__incorrect_path_option",
-    "test_pre_commit_config_shellcheck___parse_file__empty",
-    "test_pre_commit_config_shellcheck___parse_file__incorrect_file_type",
+    "test_pre_commit_config_shellcheck___parse_documents",
+    "test_pre_commit_config_shellcheck___parse_documents__incorrect_path_option",
+    "test_pre_commit_config_shellcheck___parse_documents__empty",
+    "test_pre_commit_config_shellcheck___parse_documents__incorrect_file_type",
     "test_pre_commit_config_shellcheck___get_options__missing_path_option",
+    "test_pre_commit_config_shellcheck___get_options__merge",
+    "test_pre_commit_config_shellcheck___get_options__merge_config",
     "test_pre_commit_config_shellcheck___find_entries",
     "test_pre_commit_config_shellcheck___check_entries",
     "test_pre_commit_config_shellcheck___get_options",
+    "test_pre_commit_config_shellcheck__check__cache",
+    "test_pre_commit_config_shellcheck___load_cached_result__changed_content",
+    "test_pre_commit_config_shellcheck___load_cached_result__touched",
+    "test_pre_commit_config_shellcheck___load_cached_result__upgraded",
+    "test_pre_commit_config_shellcheck___load_cached_result__changed_options",
+    "test_pre_commit_config_shellcheck___load_cached_result__shard",
+    "test_pre_commit_config_shellcheck___load_cached_result__changed_settings",
+    "test_pre_commit_config_shellcheck___check_entries__fail_fast",
+    "test_pre_commit_config_shellcheck___check_entries__fail_fast__order",
+    "test_adaptive_concurrency__get_cpu_limit",
+    "test_adaptive_concurrency__get_cpu_limit__unlimited",
+    "test_adaptive_concurrency__max_jobs",
+    "test_adaptive_concurrency__update",
+    "test_adaptive_concurrency__update__mixed_costs",
+    "test_adaptive_concurrency__update__host_load",
+    "test_pre_commit_config_shellcheck___check_entries__diagnostics",
+    "test_metrics__render",
+    "test_metrics__disabled",
+    "test_pre_commit_config_shellcheck__check__metrics_file",
+    "test_pre_commit_config_shellcheck___is_trivially_clean",
+    "test_pre_commit_config_shellcheck___is_trivially_clean__shellcheck",
+    "test_pre_commit_config_shellcheck___run_entries__no_prefilter",
+    "test_pre_commit_config_shellcheck___get_shard",
+    "test_pre_commit_config_shellcheck___get_shard__invalid",
+    "test_pre_commit_config_shellcheck__check__shard_merge",
+    "test_pre_commit_config_shellcheck___merge_results__missing_shard",
+    "test_pre_commit_config_shellcheck___merge_results__missing_fail_fast",
+    "test_pre_commit_config_shellcheck___run_entries__deduplicate",
+    "test_pre_commit_config_shellcheck___audit_history",
+    "test_pre_commit_config_shellcheck___audit_history__wrong_range",
+    "test_pre_commit_config_shellcheck___list_entries__multiple_documents",
+    "test_pre_commit_config_shellcheck___list_entries__stdin",
+    "test_pre_commit_config_shellcheck___check_entries__multiple_documents",
+    "test_pre_commit_config_shellcheck___predict_makespan",
+    "test_pre_commit_config_shellcheck___get_expected_costs",
+    "test_pre_commit_config_shellcheck___load_durations__bad_records",
+    "test_pre_commit_config_shellcheck___run_entries__longest_first",
+    "test_pre_commit_config_shellcheck___run_entries__wait_any",
+    "test_language_server_apply_change",
+    "test_language_server___reparse_hooks",
+    "test_language_server_serve",
+    "test_language_server_serve__change",
+    "test_language_server___run_shellcheck",
+    "test_language_server___lint__unacceptable_character",
+    "test_language_server___store_result__bad_output",
+    "test_language_server___work__failed_revision",
+    "test_process_launcher_spawn",
+    "test_process_launcher_spawn__kill",
+    "test_process_launcher_spawn__signals",
+    "test_pre_commit_config_shellcheck___check_entry_file__benchmark",
+    "test_pre_commit_config_shellcheck___check_entries__archive",
+    "test_pre_commit_config_shellcheck___check_entries__zip_archive",
+    "test_pre_commit_config_shellcheck___list_entries__archive_without_config",
+    "test_pre_commit_config_shellcheck___list_entries__bad_archive",
 ]
 
 
@@ -64,7 +188,45 @@ def test_pre_commit_config_shellcheck___get_options__missing_path_option(
     assert checker.options.path == ".pre-commit-config.yaml"
 
 
-def test_pre_commit_config_shellcheck___parse_file(
+def test_pre_commit_config_shellcheck___get_options__merge(
+    mocker: MockerFixture,
+) -> None:
+    """
+    _get_options method must recognize merge command after other options.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch(
+        "sys.argv",
+        ["pre_commit_config_shellcheck.py", "-d", "merge", "a.json", "b.json"],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+
+    assert checker.options.command == "merge"
+    assert checker.options.partials == ["a.json", "b.json"]
+    assert checker.options.diagnostics
+
+
+def test_pre_commit_config_shellcheck___get_options__merge_config(
+    mocker: MockerFixture,
+) -> None:
+    """
+    _get_options method must check config named merge given alone.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py", "merge"])
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+
+    assert checker.options.command == "check"
+    assert checker.options.path == "merge"
+
+
+def test_pre_commit_config_shellcheck___parse_documents(
     mocker: MockerFixture, parsed_file: Dict[str, Any]
 ) -> None:
     """
@@ -82,14 +244,14 @@ def test_pre_commit_config_shellcheck___parse_file(
 
     checker = PreCommitConfigShellcheck()  # type: ignore
 
-    assert checker._parse_file() == parsed_file
+    assert checker._parse_documents() == [parsed_file]
 
 
-def test_pre_commit_config_shellcheck___parse_file__incorrect_path_option(
+def test_pre_commit_config_shellcheck___parse_documents__incorrect_path_option(
     mocker: MockerFixture, capsys: CaptureFixture  # type: ignore
 ) -> None:
     """
-    _parse_file method must exit with file not found error.
+    _parse_documents method must exit with file not found error.
 
     :param mocker: mock
     :type mocker: MockerFixture
@@ -100,17 +262,17 @@ def test_pre_commit_config_shellcheck___parse_file__incorrect_path_option(
 
     checker = PreCommitConfigShellcheck()  # type: ignore
     with pytest.raises(SystemExit):
-        checker._parse_file()
+        checker._parse_documents()
 
     captured = capsys.readouterr()
     assert captured.err == "No file test.yaml found\n"
 
 
-def test_pre_commit_config_shellcheck___parse_file__empty(
+def test_pre_commit_config_shellcheck___parse_documents__empty(
     mocker: MockerFixture,
 ) -> None:
     """
-    _get_entries method must return None.
+    _parse_documents method must return no documents.
 
     :param mocker: mock
     :type mocker: MockerFixture
@@ -125,14 +287,14 @@ def test_pre_commit_config_shellcheck___parse_file__empty(
 
     checker = PreCommitConfigShellcheck()  # type: ignore
 
-    assert checker._parse_file() is None
+    assert checker._parse_documents() == []
 
 
-def test_pre_commit_config_shellcheck___parse_file__incorrect_file_type(
+def test_pre_commit_config_shellcheck___parse_documents__incorrect_file_type(
     mocker: MockerFixture, capsys: CaptureFixture  # type: ignore
 ) -> None:
     """
-    _parse_file method must exit with file is not YAML error.
+    _parse_documents method must exit with file is not YAML error.
 
     :param mocker: mock
     :type mocker: MockerFixture
@@ -143,7 +305,7 @@ def test_pre_commit_config_shellcheck___parse_file__incorrect_file_type(
 
     checker = PreCommitConfigShellcheck()  # type: ignore
     with pytest.raises(SystemExit):
-        checker._parse_file()
+        checker._parse_documents()
 
     captured = capsys.readouterr()
     assert captured.err == "tests/__init__.py is not a YAML file\n"
@@ -214,7 +376,7 @@ def test_pre_commit_config_shellcheck___find_entries__string(
     checker = PreCommitConfigShellcheck()  # type: ignore
 
     with pytest.raises(SystemExit):
-        checker._find_entries(checker._parse_file())
+        checker._find_entries(checker._parse_documents()[0])
 
     captured = capsys.readouterr()
     assert (
@@ -459,6 +621,9 @@ def test_pre_commit_config_shellcheck___check_entries__stderr(
         [
             "pre_commit_config_shellcheck.py",
             "tests/fixtures/.pre-commit-config.yaml",
+            "--no-prefilter",
+            "--launcher",
+            "popen",
         ],
     )
     mocker.patch(
@@ -492,6 +657,9 @@ def test_pre_commit_config_shellcheck___check_entries__timeout(
         [
             "pre_commit_config_shellcheck.py",
             "tests/fixtures/.pre-commit-config.yaml",
+            "--no-prefilter",
+            "--launcher",
+            "popen",
         ],
     )
     mocker.patch(
@@ -539,3 +707,1641 @@ def test_pre_commit_config_shellcheck___check_entries__wrong_shellcheck(
     captured = capsys.readouterr()
     expected = "No shellcheck found: '/test/shellcheck'\n"
     assert captured.err == expected
+
+
+def test_pre_commit_config_shellcheck__check__cache(
+    mocker: MockerFixture, capsys: CaptureFixture, tmp_path: Path  # type: ignore
+) -> None:
+    """
+    Check method must replay previous result without parsing the file.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--cache-dir",
+            str(tmp_path),
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit) as first:
+        checker.check()
+    expected = capsys.readouterr().out
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    read = mocker.spy(checker, "_read_file")
+    parse = mocker.spy(checker, "_parse_documents")
+    with pytest.raises(SystemExit) as second:
+        checker.check()
+
+    read.assert_not_called()
+    parse.assert_not_called()
+    assert capsys.readouterr().out == expected
+    assert second.value.code == first.value.code == checker.EXIT_CODE_ERROR
+
+
+def test_pre_commit_config_shellcheck___load_cached_result__changed_content(
+    mocker: MockerFixture, tmp_path: Path
+) -> None:
+    """
+    _load_cached_result method must return None if the config content changed.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    config = tmp_path / ".pre-commit-config.yaml"
+    shutil.copy("tests/fixtures/.pre-commit-config.yaml", config)
+    mocker.patch(
+        "sys.argv",
+        ["pre_commit_config_shellcheck.py", str(config), "-c", str(tmp_path)],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit):
+        checker.check()
+    config.write_text(config.read_text().replace("${NAME}", '"${NAME}"'))
+
+    assert checker._load_cached_result() is None
+
+
+def test_pre_commit_config_shellcheck___load_cached_result__touched(
+    mocker: MockerFixture, tmp_path: Path
+) -> None:
+    """
+    _load_cached_result method must return result if only the config mtime changed.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    config = tmp_path / ".pre-commit-config.yaml"
+    shutil.copy("tests/fixtures/.pre-commit-config.yaml", config)
+    mocker.patch(
+        "sys.argv",
+        ["pre_commit_config_shellcheck.py", str(config), "-c", str(tmp_path)],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    mocker.patch.object(checker, "_write_output")
+    checker.check()
+    expected = checker._write_output.call_args.kwargs  # type: ignore
+    os.utime(config, ns=(0, 0))
+
+    assert checker._load_cached_result() == (expected["output"], expected["code"])
+
+
+def test_pre_commit_config_shellcheck___load_cached_result__upgraded(
+    mocker: MockerFixture, tmp_path: Path
+) -> None:
+    """
+    _load_cached_result method must return None if the tool version changed.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "-c",
+            str(tmp_path),
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit):
+        checker.check()
+    mocker.patch("pre_commit_config_shellcheck.__version__", "0.0.0")
+
+    assert checker._load_cached_result() is None
+
+
+def test_pre_commit_config_shellcheck___load_cached_result__changed_options(
+    mocker: MockerFixture, tmp_path: Path
+) -> None:
+    """
+    _load_cached_result method must return None if shellcheck changed.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "-c",
+            str(tmp_path),
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit):
+        checker.check()
+    checker.options.shellcheck = shutil.which("sh")
+
+    assert checker._load_cached_result() is None
+
+
+def test_pre_commit_config_shellcheck___load_cached_result__shard(
+    mocker: MockerFixture, tmp_path: Path
+) -> None:
+    """
+    _load_cached_result method must return partial result of the same shard.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "-c",
+            str(tmp_path),
+            "--shard",
+            "0/2",
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    mocker.patch.object(checker, "_write_output")
+    checker.check()
+    expected = checker._write_output.call_args.kwargs  # type: ignore
+
+    assert checker._load_cached_result() == (expected["output"], expected["code"])
+
+
+@pytest.mark.parametrize("changed", ["opts", "rc_file"])
+def test_pre_commit_config_shellcheck___load_cached_result__changed_settings(
+    mocker: MockerFixture, tmp_path: Path, changed: str
+) -> None:
+    """
+    _load_cached_result method must return None if shellcheck settings changed.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    :param changed: changed settings source
+    :type changed: str
+    """
+    mocker.patch.dict(os.environ, {"XDG_CONFIG_HOME": str(tmp_path)})
+    os.environ.pop("SHELLCHECK_OPTS", None)
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "-c",
+            str(tmp_path / "cache"),
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit):
+        checker.check()
+    if changed == "opts":
+        os.environ["SHELLCHECK_OPTS"] = "--exclude=SC2016"
+    else:
+        (tmp_path / "shellcheckrc").write_text("disable=SC2016\n")
+
+    assert checker._load_cached_result() is None
+
+
+@pytest.mark.parametrize(
+    "launcher,process_class",
+    [("popen", subprocess.Popen), ("spawn", SpawnedProcess)],
+)
+def test_pre_commit_config_shellcheck___check_entries__fail_fast(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,  # type: ignore
+    tmp_path: Path,
+    launcher: str,
+    process_class: type,
+) -> None:
+    """
+    _check_entries method must stop at the first entry with issues.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    :param launcher: processes launcher
+    :type launcher: str
+    :param process_class: class of started processes
+    :type process_class: type
+    """
+    shellcheck = tmp_path / "shellcheck"
+    shellcheck.write_text(SLOW_SHELLCHECK.format(python=sys.executable))
+    shellcheck.chmod(0o755)
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--fail-fast",
+            "--launcher",
+            launcher,
+            "--shellcheck",
+            str(shellcheck),
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    entry = checker._list_entries()[1]
+    entries = [
+        entry,
+        {
+            "id": {"line": 20, "id": "removestar-2"},
+            "entry": {"line": 21, "entry": "removestar ${X}  # slow"},  # noqa: FS003
+        },
+    ]
+    mocker.patch.object(checker, "_list_entries", return_value=entries)
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=2)
+    checker.metrics.enabled = True
+    kill = mocker.spy(process_class, "kill")
+    with pytest.raises(SystemExit) as exit_:
+        checker._check_entries()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert 'In entry "removestar" on line 17:' in captured.out
+    assert "removestar-2" not in captured.out
+    assert kill.call_count == 1
+    assert checker.metrics.counters["entries_skipped"] == 1
+
+
+@pytest.mark.parametrize("launcher", ["popen", "spawn"])
+def test_pre_commit_config_shellcheck___check_entries__fail_fast__order(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,  # type: ignore
+    tmp_path: Path,
+    launcher: str,
+) -> None:
+    """
+    _check_entries method must report the first failing entry in config order.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    :param launcher: processes launcher
+    :type launcher: str
+    """
+    shellcheck = tmp_path / "shellcheck"
+    shellcheck.write_text(SLOW_SHELLCHECK.format(python=sys.executable))
+    shellcheck.chmod(0o755)
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--fail-fast",
+            "--launcher",
+            launcher,
+            "--shellcheck",
+            str(shellcheck),
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    entries = [
+        {
+            "id": {"line": 16, "id": "removestar"},
+            "entry": {"line": 17, "entry": "removestar ${X}  # slow"},  # noqa: FS003
+        },
+        {
+            "id": {"line": 20, "id": "removestar-2"},
+            "entry": {"line": 21, "entry": "removestar ${Y}"},  # noqa: FS003
+        },
+    ]
+    mocker.patch.object(checker, "_list_entries", return_value=entries)
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=2)
+    with pytest.raises(SystemExit) as exit_:
+        checker._check_entries()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert 'In entry "removestar" on line 17:' in captured.out
+    assert "removestar-2" not in captured.out
+
+
+def test_adaptive_concurrency__get_cpu_limit(mocker: MockerFixture) -> None:
+    """
+    get_cpu_limit method must respect cgroup CPU quota.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch("os.sched_getaffinity", return_value=set(range(16)))
+    mocker.patch.object(
+        AdaptiveConcurrency, "_read_cgroup_file", return_value="150000 100000"
+    )
+
+    assert AdaptiveConcurrency.get_cpu_limit() == 2
+
+
+def test_adaptive_concurrency__get_cpu_limit__unlimited(mocker: MockerFixture) -> None:
+    """
+    get_cpu_limit method must return available CPUs number without quota.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch("os.sched_getaffinity", return_value=set(range(16)))
+    mocker.patch.object(
+        AdaptiveConcurrency, "_read_cgroup_file", return_value="max 100000"
+    )
+
+    assert AdaptiveConcurrency.get_cpu_limit() == 16
+
+
+def test_adaptive_concurrency__max_jobs(mocker: MockerFixture) -> None:
+    """
+    Concurrency limit must not exceed memory limit and max jobs ceiling.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=8)
+    mocker.patch.object(
+        AdaptiveConcurrency,
+        "get_available_memory",
+        return_value=AdaptiveConcurrency.JOB_MEMORY * 4,
+    )
+
+    assert AdaptiveConcurrency().limit == 4
+    assert AdaptiveConcurrency(max_jobs=3).limit == 3
+
+
+def test_adaptive_concurrency__update(mocker: MockerFixture) -> None:
+    """
+    Update method must shrink concurrency on contention and grow it back.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=4)
+    mocker.patch.object(AdaptiveConcurrency, "get_available_memory", return_value=None)
+    mocker.patch("os.cpu_count", return_value=4)
+    loadavg = mocker.patch("os.getloadavg", return_value=(8.0, 8.0, 8.0))
+    log = mocker.Mock()
+
+    concurrency = AdaptiveConcurrency(log=log)
+    concurrency.update(0.1)
+    assert concurrency.target == 3
+
+    loadavg.return_value = (1.0, 1.0, 1.0)
+    concurrency.update(1.0)
+    assert concurrency.target == 2
+
+    concurrency.update(0.1)
+    concurrency.update(0.1)
+    concurrency.update(0.1)
+    concurrency.update(0.1)
+    assert concurrency.target == 4
+    assert log.call_args_list[0].args == ("scheduler: 4 jobs limited by CPU (CPU: 4)",)
+    assert log.call_args_list[1].args == (
+        "scheduler: 4 -> 3 jobs: load average 8.00 exceeds 4 host CPUs",
+    )
+
+
+def test_adaptive_concurrency__update__mixed_costs(mocker: MockerFixture) -> None:
+    """
+    Update method must not shrink concurrency for entries of different size.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=8)
+    mocker.patch.object(AdaptiveConcurrency, "get_available_memory", return_value=None)
+    mocker.patch("os.cpu_count", return_value=8)
+    mocker.patch("os.getloadavg", return_value=(1.0, 1.0, 1.0))
+
+    concurrency = AdaptiveConcurrency(log=mocker.Mock())
+    for latency, cost in [(0.1, 1.0), (0.8, 8.0), (0.4, 4.0), (1.6, 16.0)]:
+        concurrency.update(latency, cost)
+
+    assert concurrency.target == 8
+
+
+def test_adaptive_concurrency__update__host_load(mocker: MockerFixture) -> None:
+    """
+    Update method must compare load average with host CPUs, not CPU quota.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=2)
+    mocker.patch.object(AdaptiveConcurrency, "get_available_memory", return_value=None)
+    mocker.patch("os.cpu_count", return_value=16)
+    mocker.patch("os.getloadavg", return_value=(8.0, 8.0, 8.0))
+
+    concurrency = AdaptiveConcurrency(log=mocker.Mock())
+    concurrency.update(0.1, 1.0)
+
+    assert concurrency.target == 2
+
+
+def test_pre_commit_config_shellcheck___check_entries__diagnostics(
+    mocker: MockerFixture, capsys: CaptureFixture  # type: ignore
+) -> None:
+    """
+    _check_entries method must write scheduler decisions in stderr.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--max-jobs",
+            "1",
+            "--diagnostics",
+        ],
+    )
+
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=4)
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit):
+        checker._check_entries()
+
+    captured = capsys.readouterr()
+    assert captured.err.startswith("scheduler: 1 jobs limited by max jobs (")
+    assert 'In entry "removestar" on line 17:' in captured.out
+
+
+def test_metrics__render() -> None:
+    """Render method must return counters and phase durations histograms."""
+    metrics = Metrics(enabled=True)
+    metrics.inc("entries_found", 2)
+    with metrics.measure("parse"):
+        pass
+    metrics.durations["wait"].append(0.2)
+
+    rendered = metrics.render()
+
+    assert (
+        "# TYPE pre_commit_config_shellcheck_entries_found_total counter\n" in rendered
+    )
+    assert "\npre_commit_config_shellcheck_entries_found_total 2\n" in rendered
+    assert "\npre_commit_config_shellcheck_cache_hits_total 0\n" in rendered
+    assert (
+        '\npre_commit_config_shellcheck_phase_duration_seconds_bucket{phase="wait",le="0.1"} 0\n'  # noqa: E501
+        in rendered  # noqa: W503
+    )
+    assert (
+        '\npre_commit_config_shellcheck_phase_duration_seconds_bucket{phase="wait",le="0.5"} 1\n'  # noqa: E501
+        in rendered  # noqa: W503
+    )
+    assert (
+        '\npre_commit_config_shellcheck_phase_duration_seconds_count{phase="parse"} 1\n'  # noqa: E501
+        in rendered  # noqa: W503
+    )
+
+
+def test_metrics__disabled() -> None:
+    """Metrics must not be collected if disabled."""
+    metrics = Metrics()
+    metrics.inc("entries_found", 2)
+    with metrics.measure("parse"):
+        pass
+
+    assert metrics.counters["entries_found"] == 0
+    assert metrics.durations["parse"] == []
+
+
+def test_pre_commit_config_shellcheck__check__metrics_file(
+    mocker: MockerFixture, tmp_path: Path
+) -> None:
+    """
+    Check method must write metrics file.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    metrics_file = tmp_path / "metrics" / "pre-commit-config-shellcheck.prom"
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--metrics-file",
+            str(metrics_file),
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit):
+        checker.check()
+
+    metrics = metrics_file.read_text()
+    assert "\npre_commit_config_shellcheck_configs_parsed_total 1\n" in metrics
+    assert "\npre_commit_config_shellcheck_entries_checked_total 1\n" in metrics
+    assert "\npre_commit_config_shellcheck_entries_prefiltered_total 1\n" in metrics
+    assert "\npre_commit_config_shellcheck_shellcheck_spawns_total 1\n" in metrics
+    assert os.listdir(metrics_file.parent) == [metrics_file.name]
+
+
+def test_pre_commit_config_shellcheck___is_trivially_clean(
+    mocker: MockerFixture,
+) -> None:
+    """
+    _is_trivially_clean method must accept only plain commands.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py"])
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    clean = [
+        entry
+        for entry in PREFILTER_CORPUS
+        if checker._is_trivially_clean({"entry": {"line": 1, "entry": entry}})
+    ]
+
+    assert clean == PREFILTER_CORPUS[:8]
+
+
+@pytest.mark.parametrize("entry", PREFILTER_CORPUS)
+def test_pre_commit_config_shellcheck___is_trivially_clean__shellcheck(
+    mocker: MockerFixture, entry: str
+) -> None:
+    """
+    _is_trivially_clean method must never hide ShellCheck diagnostics.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param entry: entry to check
+    :type entry: str
+    """
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py"])
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    data = {"id": {"line": 1, "id": "test"}, "entry": {"line": 2, "entry": entry}}
+    tmp = checker._create_entry_file(data)  # type: ignore
+    with tmp:
+        stdout, _ = checker._check_entry_file(data, tmp)  # type: ignore
+
+    assert not (checker._is_trivially_clean(data) and stdout)  # type: ignore
+
+
+def test_pre_commit_config_shellcheck___run_entries__no_prefilter(
+    mocker: MockerFixture,
+) -> None:
+    """
+    _run_entries method must check all entries with ShellCheck if prefilter disabled.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--no-prefilter",
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    spawn = mocker.spy(checker, "_spawn_entry_file")
+    results = checker._run_entries(checker._list_entries())
+
+    assert spawn.call_count == 2
+    assert results[0] == ("", checker.EXIT_CODE_SUCCESS)
+    assert results[1][1] == checker.EXIT_CODE_ERROR  # type: ignore
+
+
+def test_pre_commit_config_shellcheck___get_shard() -> None:
+    """_get_shard method must return shard index and shards count."""
+    assert PreCommitConfigShellcheck._get_shard("1/3") == (1, 3)
+
+
+@pytest.mark.parametrize("value", ["1", "3/3", "-1/3", "a/b", "1/2/3"])
+def test_pre_commit_config_shellcheck___get_shard__invalid(value: str) -> None:
+    """
+    _get_shard method must reject incorrect shards.
+
+    :param value: shard option value
+    :type value: str
+    """
+    with pytest.raises(ArgumentTypeError):
+        PreCommitConfigShellcheck._get_shard(value)
+
+
+def test_pre_commit_config_shellcheck__check__shard_merge(
+    mocker: MockerFixture, capsys: CaptureFixture, tmp_path: Path  # type: ignore
+) -> None:
+    """
+    Merged results of the sharded runs must be the same as the single run result.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    argv = [
+        "pre_commit_config_shellcheck.py",
+        "tests/fixtures/.pre-commit-config.yaml",
+        "--no-prefilter",
+    ]
+    mocker.patch("sys.argv", argv)
+    with pytest.raises(SystemExit) as expected:
+        PreCommitConfigShellcheck().check()  # type: ignore
+    expected_output = capsys.readouterr().out
+
+    partials = []
+    for shard in range(3):
+        mocker.patch("sys.argv", [*argv, "--shard", f"{shard}/3"])
+        with pytest.raises(SystemExit) as exit_:
+            PreCommitConfigShellcheck().check()  # type: ignore
+        assert exit_.value.code == PreCommitConfigShellcheck.EXIT_CODE_SUCCESS
+        partial = tmp_path / f"shard-{shard}.json"
+        partial.write_text(capsys.readouterr().out)
+        partials.append(str(partial))
+
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py", "merge", *partials])
+    with pytest.raises(SystemExit) as merged:
+        PreCommitConfigShellcheck().check()  # type: ignore
+
+    assert capsys.readouterr().out == expected_output
+    assert merged.value.code == expected.value.code
+
+
+def test_pre_commit_config_shellcheck___merge_results__missing_shard(
+    mocker: MockerFixture, capsys: CaptureFixture, tmp_path: Path  # type: ignore
+) -> None:
+    """
+    _merge_results method must exit with error if some shards are missing.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--shard",
+            "1/2",
+        ],
+    )
+    with pytest.raises(SystemExit):
+        PreCommitConfigShellcheck().check()  # type: ignore
+    partial = tmp_path / "shard-1.json"
+    partial.write_text(capsys.readouterr().out)
+
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py", "merge", str(partial)])
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit) as exit_:
+        checker._merge_results()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert (
+        captured.err
+        == "Failed to merge partial results: some shards are missing or duplicated\n"  # noqa: E501, W503
+    )
+
+
+def test_pre_commit_config_shellcheck___merge_results__missing_fail_fast(
+    mocker: MockerFixture, capsys: CaptureFixture, tmp_path: Path  # type: ignore
+) -> None:
+    """
+    _merge_results method must exit with error if partial result lacks fields.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--shard",
+            "0/1",
+        ],
+    )
+    with pytest.raises(SystemExit):
+        PreCommitConfigShellcheck().check()  # type: ignore
+    record = json.loads(capsys.readouterr().out)
+    del record["fail_fast"]
+    partial = tmp_path / "shard-0.json"
+    partial.write_text(json.dumps(record))
+
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py", "merge", str(partial)])
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit) as exit_:
+        checker._merge_results()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert captured.err == "Failed to merge partial results: 'fail_fast'\n"
+
+
+def test_pre_commit_config_shellcheck___run_entries__deduplicate(
+    mocker: MockerFixture,
+) -> None:
+    """
+    _run_entries method must check entries with the same body only once.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py"])
+    entries = [
+        {
+            "id": {"line": 1, "id": "removestar-1"},
+            "entry": {"line": 2, "entry": "removestar -i ${NAME}"},  # noqa: FS003
+        },
+        {
+            "id": {"line": 10, "id": "removestar-10"},
+            "entry": {"line": 11, "entry": "removestar -i ${NAME}"},  # noqa: FS003
+        },
+    ]
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    spawn = mocker.spy(checker, "_spawn_entry_file")
+    results = checker._run_entries(entries)  # type: ignore
+
+    assert spawn.call_count == 1
+    assert 'In entry "removestar-1" on line 2:' in results[0][0]  # type: ignore
+    assert 'In entry "removestar-10" on line 11:' in results[1][0]  # type: ignore
+
+
+def test_pre_commit_config_shellcheck___audit_history(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,  # type: ignore
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    _audit_history method must report revisions where issues appeared or disappeared.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    :param monkeypatch: monkeypatch fixture
+    :type monkeypatch: pytest.MonkeyPatch
+    """
+    monkeypatch.chdir(tmp_path)
+    config = tmp_path / ".pre-commit-config.yaml"
+    hook = '    - id: "{}"\n      entry: "{}"\n'
+    git = ["git", "-c", "user.name=test", "-c", "user.email=test@example.com"]
+    subprocess.run([*git, "init", "-q"], check=True)  # nosec
+    revisions: List[str] = []
+    for hooks in [
+        [("a", 'a \\"$1\\"'), ("b", "b -i ${NAME}")],  # noqa: FS003
+        [
+            ("a", 'a \\"$1\\"'),
+            ("b", 'b -i \\"${NAME}\\"'),
+            ("c", "c ${X}"),
+        ],  # noqa: E501, FS003
+        [
+            ("a", 'a \\"$1\\"'),
+            ("b", 'b -i \\"${NAME}\\"'),
+            ("c", "c ${X}"),
+        ],  # noqa: E501, FS003
+    ]:
+        config.write_text(
+            'repos:\n- repo: "local"\n  hooks:\n'
+            + "".join(hook.format(*item) for item in hooks)  # noqa: W503
+        )
+        (tmp_path / "README").write_text(str(len(revisions)))
+        subprocess.run([*git, "add", "-A"], check=True)  # nosec
+        subprocess.run([*git, "commit", "-q", "-m", "test"], check=True)  # nosec
+        revision = subprocess.check_output(["git", "rev-parse", "HEAD"])  # nosec
+        revisions.append(revision.decode("utf-8").strip())
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py", "--history", "HEAD"])
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    spawn = mocker.spy(checker, "_spawn_entry_file")
+    with pytest.raises(SystemExit) as exit_:
+        checker._audit_history()
+    expected = [
+        f'Hook "b":\n  {revisions[0]} appeared: SC2086\n',
+        f"  {revisions[1]} disappeared: SC2086\n",
+        f'Hook "c":\n  {revisions[1]} appeared: SC2086\n',
+    ]
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert spawn.call_count == 4
+    assert captured.out == "".join(expected)
+
+
+def test_pre_commit_config_shellcheck___audit_history__wrong_range(
+    mocker: MockerFixture, capsys: CaptureFixture  # type: ignore
+) -> None:
+    """
+    _audit_history method must exit with error on incorrect revisions range.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    """
+    mocker.patch(
+        "sys.argv",
+        ["pre_commit_config_shellcheck.py", "--history", "no-such-revision"],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit) as exit_:
+        checker._audit_history()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert captured.err.startswith("Failed to list revisions no-such-revision: ")
+
+
+def test_pre_commit_config_shellcheck___list_entries__multiple_documents(
+    mocker: MockerFixture,
+) -> None:
+    """
+    _list_entries method must return entries of all documents with their indexes.
+
+    Config with multiple documents is counted as a single parsed config.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config--multiple.yaml",
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    checker.metrics.enabled = True
+
+    assert checker._list_entries() == [
+        {
+            "id": {"line": 4, "id": "removestar"},
+            "entry": {"line": 5, "entry": "removestar -i ${NAME}"},  # noqa: FS003
+            "document": {"index": 1},
+        },
+        {
+            "id": {"line": 11, "id": "seed-isort-config"},
+            "entry": {"line": 12, "entry": "seed-isort-config"},
+            "document": {"index": 3},
+        },
+        {
+            "id": {"line": 13, "id": "removestar"},
+            "entry": {"line": 14, "entry": "removestar -i ${NAME}"},  # noqa: FS003
+            "document": {"index": 3},
+        },
+    ]
+    assert checker.metrics.counters["configs_parsed"] == 1
+
+
+def test_pre_commit_config_shellcheck___list_entries__stdin(
+    mocker: MockerFixture,
+) -> None:
+    """
+    _list_entries method must read config from stdin.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py", "-"])
+    with open("tests/fixtures/.pre-commit-config.yaml", "rb") as stream:
+        mocker.patch("sys.stdin", io.TextIOWrapper(io.BytesIO(stream.read())))
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+
+    assert checker._list_entries() == [
+        {
+            "entry": {"line": 9, "entry": "seed-isort-config\nsleep infinity\n"},
+            "id": {"line": 4, "id": "seed-isort-config"},
+        },
+        {
+            "entry": {"line": 17, "entry": "removestar -i ${NAME}"},  # noqa: FS003
+            "id": {"line": 13, "id": "removestar"},
+        },
+    ]
+
+
+def test_pre_commit_config_shellcheck___check_entries__multiple_documents(
+    mocker: MockerFixture, capsys: CaptureFixture  # type: ignore
+) -> None:
+    """
+    _check_entries method must report entries with their document indexes.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config--multiple.yaml",
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit) as exit_:
+        checker._check_entries()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert captured.out.count("\nIn ") == 2
+    assert 'In document 1 entry "removestar" on line 5:' in captured.out
+    assert 'In document 3 entry "removestar" on line 14:' in captured.out
+
+
+def test_pre_commit_config_shellcheck___predict_makespan() -> None:
+    """_predict_makespan method must return time of the greedy schedule."""
+    assert PreCommitConfigShellcheck._predict_makespan([3, 2, 2, 1], 2) == 4
+    assert PreCommitConfigShellcheck._predict_makespan([3, 2, 2, 1], 1) == 8
+
+
+def test_pre_commit_config_shellcheck___get_expected_costs(
+    mocker: MockerFixture,
+) -> None:
+    """
+    _get_expected_costs method must use recorded durations and fall back to size.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py"])
+    entries = [
+        {"id": {"line": 1, "id": "a"}, "entry": {"line": 2, "entry": "a" * 10}},
+        {"id": {"line": 3, "id": "b"}, "entry": {"line": 4, "entry": "b" * 40}},
+    ]
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    durations = {checker._get_entry_hash(entries[0]): [2.0, 10]}  # type: ignore
+
+    assert checker._get_expected_costs(entries, {}) == ([10, 40], False)  # type: ignore  # noqa: E501
+    assert checker._get_expected_costs(entries, durations) == ([2.0, 8.0], True)  # type: ignore  # noqa: E501
+
+
+@pytest.mark.parametrize(
+    "content,expected",
+    [
+        ('{"abc": 1}', {}),
+        ('{"abc": [1, 2, 3], "def": ["1", 2], "ghi": [true, 2]}', {}),
+        ('{"abc": [-1, 2], "def": [NaN, 2], "ghi": [1.5, 20]}', {"ghi": [1.5, 20]}),
+        ("[1, 2]", {}),
+        ("1", {}),
+    ],
+)
+def test_pre_commit_config_shellcheck___load_durations__bad_records(
+    mocker: MockerFixture, tmp_path: Path, content: str, expected: Dict[str, Any]
+) -> None:
+    """
+    _load_durations method must skip records other than two non-negative numbers.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    :param content: durations file content
+    :type content: str
+    :param expected: expected loaded durations
+    :type expected: Dict[str, Any]
+    """
+    mocker.patch(
+        "sys.argv", ["pre_commit_config_shellcheck.py", "--cache-dir", str(tmp_path)]
+    )
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    (tmp_path / checker.DURATIONS_FILE).write_text(content)
+    entries = [{"id": {"line": 1, "id": "a"}, "entry": {"line": 2, "entry": "a"}}]
+
+    durations = checker._load_durations()
+
+    assert durations == expected
+    assert checker._get_expected_costs(entries, durations)[0]  # type: ignore
+
+
+def test_pre_commit_config_shellcheck___run_entries__longest_first(
+    mocker: MockerFixture, capsys: CaptureFixture, tmp_path: Path  # type: ignore
+) -> None:
+    """
+    _run_entries method must start the most expensive entries first.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--no-prefilter",
+            "--cache-dir",
+            str(tmp_path),
+            "--diagnostics",
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    entries = checker._list_entries()
+    (tmp_path / checker.DURATIONS_FILE).write_text(
+        json.dumps({checker._get_entry_hash(entries[1]): [10.0, 1000]})
+    )
+    spawn = mocker.spy(checker, "_spawn_entry_file")
+    results = checker._run_entries(entries)
+
+    captured = capsys.readouterr()
+    assert [call.args[0] for call in spawn.call_args_list] == entries[::-1]
+    assert results[0] == ("", checker.EXIT_CODE_SUCCESS)
+    assert results[1][1] == checker.EXIT_CODE_ERROR  # type: ignore
+    assert "timing: 2 entries on " in captured.err
+    assert ", predicted makespan " in captured.err
+    durations = json.loads((tmp_path / checker.DURATIONS_FILE).read_text())
+    assert set(durations) == {checker._get_entry_hash(entry) for entry in entries}
+
+
+@pytest.mark.parametrize("launcher", ["popen", "spawn"])
+def test_pre_commit_config_shellcheck___run_entries__wait_any(
+    mocker: MockerFixture, tmp_path: Path, launcher: str
+) -> None:
+    """
+    _run_entries method must record each entry own duration.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    :param launcher: processes launcher
+    :type launcher: str
+    """
+    shellcheck = tmp_path / "shellcheck"
+    shellcheck.write_text(SLOW_SHELLCHECK.format(python=sys.executable))
+    shellcheck.chmod(0o755)
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "tests/fixtures/.pre-commit-config.yaml",
+            "--no-prefilter",
+            "--cache-dir",
+            str(tmp_path),
+            "--launcher",
+            launcher,
+            "--shellcheck",
+            str(shellcheck),
+        ],
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    # the longest entry is started first and keeps one slot busy
+    entries = [
+        {
+            "id": {"line": 16, "id": "slow"},
+            "entry": {"line": 17, "entry": "echo slow  # slow"},
+        },
+        {"id": {"line": 20, "id": "fast-1"}, "entry": {"line": 21, "entry": "echo 1"}},
+        {"id": {"line": 22, "id": "fast-2"}, "entry": {"line": 23, "entry": "echo 2"}},
+        {"id": {"line": 24, "id": "fast-3"}, "entry": {"line": 25, "entry": "echo 3"}},
+    ]
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=2)
+    # both slots are kept whatever the host load is
+    mocker.patch.object(AdaptiveConcurrency, "update")
+    render = mocker.spy(checker, "_create_entry_output")
+    results = checker._run_entries(entries)  # type: ignore
+
+    success = ("", checker.EXIT_CODE_SUCCESS)
+    assert results == [success] * len(entries)
+    # fast entries are not waiting for the slow one to be collected
+    assert render.call_args.args[0] == entries[0]
+    durations = json.loads((tmp_path / checker.DURATIONS_FILE).read_text())
+    hashes = [checker._get_entry_hash(entry) for entry in entries]  # type: ignore
+    slow, *fast = [durations[key][0] for key in hashes]
+    assert slow >= 0.5
+    assert max(fast) < slow
+
+
+def test_language_server_apply_change() -> None:
+    """apply_change method must apply full and incremental changes."""
+    text = "a: 1\nb: \U0001f600 2\n"
+    # character offsets are counted in UTF-16 code units
+    replace = {
+        "range": {
+            "start": {"line": 1, "character": 6},
+            "end": {"line": 1, "character": 7},
+        },
+        "text": "3",
+    }
+    remove = {
+        "range": {
+            "start": {"line": 0, "character": 4},
+            "end": {"line": 2, "character": 0},
+        },
+        "text": "",
+    }
+
+    assert LanguageServer.apply_change(text, {"text": "c: 3\n"}) == "c: 3\n"
+    assert LanguageServer.apply_change(text, replace) == "a: 1\nb: \U0001f600 3\n"
+    assert LanguageServer.apply_change(text, remove) == "a: 1"
+
+
+def test_language_server___reparse_hooks() -> None:
+    """_reparse_hooks method must parse only the edited hook."""
+    with open("tests/fixtures/.pre-commit-config.yaml") as stream:
+        text = stream.read()
+    lines = LanguageServer.LINE_BREAK.split(text)
+    previous = {"lines": lines, "hooks": LanguageServer._parse_hooks(text, lines)}
+
+    edited = text.replace("sleep infinity\n", "sleep infinity\n        echo $A\n")
+    edited_lines = LanguageServer.LINE_BREAK.split(edited)
+    hooks = LanguageServer._reparse_hooks(previous, edited_lines)
+
+    assert hooks == LanguageServer._parse_hooks(edited, edited_lines)
+    assert (
+        hooks[0]["entry"] == "seed-isort-config\nsleep infinity\necho $A\n"
+    )  # noqa: E501
+    assert hooks[1]["origin"] == (17, 14, 0)
+
+    edited = text.replace('repo: "local"', 'repo: "remote"')
+    edited_lines = LanguageServer.LINE_BREAK.split(edited)
+
+    assert LanguageServer._reparse_hooks(previous, edited_lines) is None
+
+
+def test_language_server_serve(mocker: MockerFixture) -> None:
+    """
+    Serve method must publish diagnostics of opened document.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=2)
+    with open("tests/fixtures/.pre-commit-config.yaml") as stream:
+        text = stream.read()
+    document = {"uri": "file:///c", "text": text}
+    messages = [
+        {"id": 1, "method": "initialize", "params": {}},
+        {"method": "textDocument/didOpen", "params": {"textDocument": document}},
+        {"id": 2, "method": "textDocument/hover", "params": {}},
+        {"id": 3, "method": "shutdown"},
+        {"method": "exit"},
+    ]
+    reader = io.BytesIO()
+    for message in messages:
+        payload = json.dumps(message)
+        reader.write(f"Content-Length: {len(payload)}\r\n\r\n{payload}".encode())
+    reader.seek(0)
+    writer = io.BytesIO()
+    server = LanguageServer("shellcheck", AdaptiveConcurrency(), reader, writer)
+
+    assert server.serve()
+
+    server.reader = io.BytesIO(writer.getvalue())
+    responses = [server.read_message(), server.read_message(), server.read_message()]
+
+    capabilities = responses[0]["result"]["capabilities"]  # type: ignore
+    diagnostics = responses[2]["params"]["diagnostics"]  # type: ignore
+    start, end = {"line": 16, "character": 28}, {"line": 16, "character": 35}
+
+    assert responses[0]["id"] == 1  # type: ignore
+    assert capabilities["textDocumentSync"]["change"] == 2
+    assert responses[1]["error"]["code"] == -32601  # type: ignore
+    assert responses[2]["method"] == "textDocument/publishDiagnostics"  # type: ignore
+    assert diagnostics == [
+        {
+            "range": {"start": start, "end": end},
+            "severity": 3,
+            "code": "SC2086",
+            "source": "shellcheck",
+            "message": "Double quote to prevent globbing and word splitting.",
+        }
+    ]
+    assert server.read_message() == {"jsonrpc": "2.0", "id": 3, "result": None}
+
+
+def test_language_server_serve__change(mocker: MockerFixture) -> None:
+    """
+    Serve method must publish diagnostics of changed document.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=2)
+    with open("tests/fixtures/.pre-commit-config.yaml") as stream:
+        text = stream.read()
+    document = {"uri": "file:///c", "text": text}
+    change = {
+        "range": {
+            "start": {"line": 16, "character": 28},
+            "end": {"line": 16, "character": 35},
+        },
+        "text": "'${NAME}'",  # noqa: FS003
+    }
+    changed = {"textDocument": {"uri": "file:///c"}, "contentChanges": [change]}
+    messages = [
+        {"method": "textDocument/didOpen", "params": {"textDocument": document}},
+        {"method": "textDocument/didChange", "params": changed},
+        {"method": "exit"},
+    ]
+    reader = io.BytesIO()
+    for message in messages:
+        payload = json.dumps(message)
+        reader.write(f"Content-Length: {len(payload)}\r\n\r\n{payload}".encode())
+    reader.seek(0)
+    writer = io.BytesIO()
+    server = LanguageServer("shellcheck", AdaptiveConcurrency(), reader, writer)
+
+    assert not server.serve()
+
+    server.reader = io.BytesIO(writer.getvalue())
+    published = []
+    message = server.read_message()
+    while message is not None:
+        published.append(message["params"]["diagnostics"])
+        message = server.read_message()
+
+    diagnostic = published[-1][0]
+
+    assert diagnostic["code"] == "SC2016"
+    assert diagnostic["range"]["start"] == {"line": 16, "character": 28}
+
+
+def test_language_server___run_shellcheck(
+    mocker: MockerFixture, tmp_path: Path
+) -> None:
+    """
+    _run_shellcheck method must check entries bodies concurrently.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    started = tmp_path / "started"
+    started.mkdir()
+    shellcheck = tmp_path / "shellcheck"
+    # every process answers only when all of them are running at once
+    shellcheck.write_text(
+        f"""#!/bin/sh
+cat > /dev/null
+touch "{started}/$$"
+for _ in $(seq 50); do
+    [ "$(ls "{started}" | wc -l)" -ge 4 ] && exec echo '{{"comments": []}}'
+    sleep 0.1
+done
+"""
+    )
+    shellcheck.chmod(0o755)
+    mocker.patch.object(AdaptiveConcurrency, "get_cpu_limit", return_value=4)
+    mocker.patch.object(AdaptiveConcurrency, "get_available_memory", return_value=None)
+    server = LanguageServer(
+        str(shellcheck), AdaptiveConcurrency(), io.BytesIO(), io.BytesIO()
+    )
+    server.revisions["file:///c"] = 1
+    bodies = [f"echo {index}" for index in range(4)]
+
+    assert server._run_shellcheck(bodies, "file:///c", 1)
+    assert server.results == {body: [] for body in bodies}
+
+
+def test_language_server___lint__unacceptable_character() -> None:
+    """_lint method must publish YAML diagnostic of config with control character."""
+    writer = io.BytesIO()
+    server = LanguageServer("shellcheck", AdaptiveConcurrency(), io.BytesIO(), writer)
+    server.revisions["file:///c"] = 1
+
+    server._lint("file:///c", "- id: a\n  entry: echo \x01\n", 1)
+
+    server.reader = io.BytesIO(writer.getvalue())
+    message = server.read_message()
+    diagnostics = message["params"]["diagnostics"]  # type: ignore
+    start = {"line": 0, "character": 0}
+
+    assert message["method"] == "textDocument/publishDiagnostics"  # type: ignore
+    assert len(diagnostics) == 1
+    assert diagnostics[0]["range"] == {"start": start, "end": start}
+    assert diagnostics[0]["source"] == "yaml"
+    assert diagnostics[0]["message"].startswith("unacceptable character #x0001")
+
+
+@pytest.mark.parametrize("stdout", [b"", b"{}", b"[]"])
+def test_language_server___store_result__bad_output(stdout: bytes) -> None:
+    """
+    _store_result method must log ShellCheck output which could not be parsed.
+
+    :param stdout: shellcheck output
+    :type stdout: bytes
+    """
+    writer = io.BytesIO()
+    server = LanguageServer("shellcheck", AdaptiveConcurrency(), io.BytesIO(), writer)
+
+    server._store_result("echo", stdout, b"")
+
+    server.reader = io.BytesIO(writer.getvalue())
+    message = server.read_message()
+
+    assert message["method"] == "window/logMessage"  # type: ignore
+    assert message["params"]["message"].startswith(  # type: ignore
+        "Failed to parse ShellCheck output: "
+    )
+    assert not server.results
+
+
+def test_language_server___work__failed_revision(mocker: MockerFixture) -> None:
+    """
+    _work method must log failed check and keep checking other documents.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    """
+    writer = io.BytesIO()
+    server = LanguageServer("shellcheck", AdaptiveConcurrency(), io.BytesIO(), writer)
+    lint = mocker.patch.object(
+        server, "_lint", side_effect=[RuntimeError("failed"), None]
+    )
+    server._update("file:///a", "a: 1\n")
+    server._update("file:///b", "b: 1\n")
+    server.stopping = True
+
+    server._work()
+
+    server.reader = io.BytesIO(writer.getvalue())
+    message = server.read_message()
+
+    assert lint.call_count == 2
+    assert message["method"] == "window/logMessage"  # type: ignore
+    assert message["params"]["message"] == (  # type: ignore
+        "Failed to check file:///a: RuntimeError('failed')"
+    )
+
+
+def test_process_launcher_spawn() -> None:
+    """Spawn method must collect output of all running processes."""
+    launcher = ProcessLauncher()
+    # output exceeding pipe buffer is read while waiting for another process
+    large = launcher.spawn(["sh", "-c", "head -c 1000000 /dev/zero"])
+    small = launcher.spawn(["sh", "-c", "echo out; echo err >&2; exit 3"])
+
+    assert small.communicate() == (b"out\n", b"err\n")
+    assert small.returncode == 3
+    assert large.communicate() == (b"\0" * 1000000, b"")
+    assert large.returncode == 0
+    assert not launcher.selector.get_map()
+
+
+def test_process_launcher_spawn__kill() -> None:
+    """Kill method must stop process and reading its output."""
+    launcher = ProcessLauncher()
+    process = launcher.spawn(["sleep", "10"])
+
+    assert process.poll() is None
+
+    process.kill()
+
+    assert process.wait() == -9
+    assert not launcher.selector.get_map()
+    with pytest.raises(FileNotFoundError):
+        launcher.spawn(["shellcheck-missing"])
+
+
+def test_process_launcher_spawn__signals() -> None:
+    """Spawn method must restore default handling of signals ignored by Python."""
+    launcher = ProcessLauncher()
+    # "yes" is killed by SIGPIPE instead of reporting the broken pipe
+    process = launcher.spawn(["sh", "-c", "yes | head -1"])
+
+    assert process.communicate() == (b"y\n", b"")
+    assert process.returncode == 0
+
+
+@pytest.mark.parametrize("launcher", ["popen", "spawn"])
+def test_pre_commit_config_shellcheck___check_entry_file__benchmark(
+    mocker: MockerFixture, launcher: str
+) -> None:
+    """
+    _check_entry_file method must start ShellCheck with the requested launcher.
+
+    Per-spawn latency against a stub ShellCheck is written to stdout,
+    run with "make benchmark" to compare launchers.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param launcher: processes launcher
+    :type launcher: str
+    """
+    mocker.patch(
+        "sys.argv",
+        [
+            "pre_commit_config_shellcheck.py",
+            "--shellcheck",
+            "tests/fixtures/shellcheck-stub",
+            "--launcher",
+            launcher,
+        ],
+    )
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    data = {"id": {"line": 1, "id": "test"}, "entry": {"line": 2, "entry": "true"}}
+    spawns = 50
+
+    started = time.perf_counter()
+    with checker._create_entry_file(data) as tmp:  # type: ignore
+        for _ in range(spawns):
+            assert checker._check_entry_file(data, tmp) == (b"", b"")  # type: ignore
+    latency = (time.perf_counter() - started) / spawns
+
+    sys.stdout.write(f"\n{launcher}: {latency * 1000:.3f} ms per spawn\n")
+
+
+@pytest.mark.parametrize("suffix,mode", [(".tar", "w"), (".tar.gz", "w:gz")])
+def test_pre_commit_config_shellcheck___check_entries__archive(
+    mocker: MockerFixture,
+    capsys: CaptureFixture,  # type: ignore
+    tmp_path: Path,
+    suffix: str,
+    mode: str,
+) -> None:
+    """
+    _check_entries method must check configs inside tar archive without extracting it.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    :param suffix: archive file suffix
+    :type suffix: str
+    :param mode: archive writing mode
+    :type mode: str
+    """
+    with open("tests/fixtures/.pre-commit-config.yaml", "rb") as stream:
+        content = stream.read()
+    members = {
+        "a/.pre-commit-config.yaml": content,
+        "a/README.rst": b"",
+        "b/.pre-commit-config.yaml": content,
+    }
+    path = str(tmp_path / f"snapshot{suffix}")
+    # typeshed accepts only literal modes, the parametrized one is a plain str
+    with tarfile.open(path, cast(Any, mode)) as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    mocker.patch(
+        "sys.argv", ["pre_commit_config_shellcheck.py", path, "--no-prefilter"]
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit) as exit_:
+        checker._check_entries()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert (
+        f'In entry "removestar" at {path}!a/.pre-commit-config.yaml:17:' in captured.out
+    )
+    assert (
+        f'In entry "removestar" at {path}!b/.pre-commit-config.yaml:17:' in captured.out
+    )
+    assert os.listdir(tmp_path) == [f"snapshot{suffix}"]
+
+
+def test_pre_commit_config_shellcheck___check_entries__zip_archive(
+    mocker: MockerFixture, capsys: CaptureFixture, tmp_path: Path  # type: ignore
+) -> None:
+    """
+    _check_entries method must check configs inside zip archive without extracting it.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    with open("tests/fixtures/.pre-commit-config.yaml", "rb") as stream:
+        content = stream.read()
+    path = str(tmp_path / "snapshot.zip")
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("a/.pre-commit-config.yaml", content)
+        archive.writestr("a/README.rst", b"")
+        archive.writestr("b/.pre-commit-config.yaml", content)
+    mocker.patch(
+        "sys.argv", ["pre_commit_config_shellcheck.py", path, "--no-prefilter"]
+    )
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit) as exit_:
+        checker._check_entries()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert (
+        f'In entry "removestar" at {path}!a/.pre-commit-config.yaml:17:' in captured.out
+    )
+    assert (
+        f'In entry "removestar" at {path}!b/.pre-commit-config.yaml:17:' in captured.out
+    )
+    assert os.listdir(tmp_path) == ["snapshot.zip"]
+
+
+def test_pre_commit_config_shellcheck___list_entries__archive_without_config(
+    mocker: MockerFixture, capsys: CaptureFixture, tmp_path: Path  # type: ignore
+) -> None:
+    """
+    _list_entries method must exit with error for archive without config members.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    path = tmp_path / "snapshot.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("a/README.rst", b"")
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py", str(path)])
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit) as exit_:
+        checker._list_entries()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_FILE_NOT_FOUND
+    assert captured.err == f"No .pre-commit-config.yaml found in {path}\n"
+
+
+def test_pre_commit_config_shellcheck___list_entries__bad_archive(
+    mocker: MockerFixture, capsys: CaptureFixture, tmp_path: Path  # type: ignore
+) -> None:
+    """
+    _list_entries method must exit with error for corrupted archive.
+
+    :param mocker: mock
+    :type mocker: MockerFixture
+    :param capsys: std output fixture
+    :type capsys: CaptureFixture
+    :param tmp_path: temporary directory fixture
+    :type tmp_path: Path
+    """
+    path = tmp_path / "snapshot.zip"
+    path.write_bytes(b"not an archive")
+    mocker.patch("sys.argv", ["pre_commit_config_shellcheck.py", str(path)])
+
+    checker = PreCommitConfigShellcheck()  # type: ignore
+    with pytest.raises(SystemExit) as exit_:
+        checker._list_entries()
+
+    captured = capsys.readouterr()
+    assert exit_.value.code == checker.EXIT_CODE_ERROR
+    assert captured.err == f"{path} is not an archive\n"